@@ -0,0 +1,129 @@
+"""
+Benchmarks for the request pipeline, run with
+
+    python bench.py [rows]
+
+Uses an in-memory sqlite database with models of its own.
+"""
+import sys
+import json
+import time
+import uuid
+import decimal
+import datetime
+
+import django
+from django.conf import settings
+
+settings.configure(
+    DATABASES={'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }},
+    INSTALLED_APPS=[],
+    ROOT_URLCONF=__name__,
+    SECRET_KEY='bench',
+)
+django.setup()
+
+import django.db.models as m
+from django.db import connection
+
+from rest.resources import Resource
+from rest.serializers import Serializer
+
+urlpatterns = []
+
+
+class Owner(m.Model):
+    name = m.TextField()
+
+    class Meta:
+        app_label = 'bench'
+
+class Item(m.Model):
+    title = m.TextField()
+    count = m.IntegerField()
+    owner = m.ForeignKey(Owner)
+    timestamp = m.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'bench'
+
+
+class Items(Resource):
+    model = Item
+    read_values = False
+
+    class Template:
+        fields = ['id', 'title', 'count', 'owner']
+        related = {
+            'owner': {
+                'fields': ['name'],
+            },
+        }
+
+class ValueItems(Items):
+    read_values = True
+
+
+def setup(rows):
+    with connection.schema_editor() as editor:
+        editor.create_model(Owner)
+        editor.create_model(Item)
+
+    owners = [Owner.objects.create(name='owner{}'.format(i)) for i in range(10)]
+    Item.objects.bulk_create(
+        Item(title='item{}'.format(i), count=i, owner=owners[i % 10])
+        for i in range(rows))
+
+
+def measure(name, func, rows, repeat=5):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print('{:<24} {:>12.0f} rows/s'.format(name, rows / best))
+    return best
+
+
+def bench_read_values(rows):
+    print('Collection GET of {} rows'.format(rows))
+    instances = measure('undjango', lambda: Items().act(), rows)
+    values = measure('values()', lambda: ValueItems().act(), rows)
+    print('{:<24} {:>12.2f}x'.format('speedup', instances / values))
+
+
+def bench_serializer(rows):
+    print('Serializing {} rows'.format(rows))
+    data = [{
+        'id': i,
+        'title': 'item{}'.format(i),
+        'price': decimal.Decimal(i) / 100,
+        'uid': uuid.uuid4(),
+        'timestamp': datetime.datetime.now(),
+    } for i in range(rows)]
+
+    def dumps():
+        # The Dehydrator methods resources needed to get through json.dumps
+        dehydrated = [dict(row, price=str(row['price']), uid=str(row['uid']),
+            timestamp=str(row['timestamp'])) for row in data]
+        return json.dumps(dehydrated).encode('utf-8')
+
+    serializer = Serializer()
+    stdlib = Serializer()
+    stdlib.fast = False
+
+    baseline = measure('json.dumps', dumps, rows)
+    measure('Serializer (stdlib)', lambda: stdlib.json(data), rows)
+    fast = measure('Serializer', lambda: serializer.json(data), rows)
+    print('{:<24} {:>12.2f}x'.format('speedup', baseline / fast))
+
+
+if __name__ == '__main__':
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    setup(rows)
+    bench_read_values(rows)
+    bench_serializer(rows)
@@ -0,0 +1,66 @@
+import threading
+
+from . import exceptions
+from .structures import NestedClass, Closing
+
+
+class Admission(NestedClass):
+    """
+    Limits the requests a resource handles at once in this process.
+
+    Requests beyond `concurrency` wait up to `timeout` seconds for a turn,
+    with at most `queue` of them waiting. Others are answered with 503 and
+    a Retry-After of `retry_after` seconds right away. Requests for one
+    object are cheap enough to always be let through. Streamed responses
+    hold their turn until they are sent.
+    """
+    # Requests handled at once, None for no limit
+    concurrency = None
+
+    queue = 0
+    timeout = 1
+    retry_after = 1
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiting = 0
+        if self.concurrency:
+            self.slots = threading.BoundedSemaphore(self.concurrency)
+
+    def exempt(self, resource):
+        return 'uid' in resource.ids and resource.method in ('GET', 'HEAD')
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            return True
+
+        with self.lock:
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.timeout)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def __call__(self, resource, act):
+        if not self.concurrency or self.exempt(resource):
+            return act()
+
+        if not self.acquire():
+            raise exceptions.ServiceUnavailable("Please try again later",
+                    retry_after=self.retry_after)
+        try:
+            response = act()
+        except BaseException:
+            self.slots.release()
+            raise
+
+        if response.streaming:
+            # The rows are read while the response is sent
+            response.streaming_content = Closing(response.streaming_content,
+                    self.slots.release)
+        else:
+            self.slots.release()
+        return response
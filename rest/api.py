@@ -30,7 +30,7 @@ class Book(Resource):
                         }
                     }
                 }
-                resource.template.update(template)
+                resource.template_options.update(template)
             elif size == 'full':
                 pass
 
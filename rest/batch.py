@@ -0,0 +1,234 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf.urls import url
+from django.db import connections, transaction
+from django.http import HttpRequest, HttpResponse, QueryDict
+
+from . import exceptions
+from . import middleware
+from . import serializers
+
+
+class Batch:
+    """
+    A view running a list of resource operations in one request, each
+    through the resource's own view.
+
+        class Batch(batch.Batch):
+            resources = (Person, Image)
+
+        urlpatterns += Batch.urls()
+
+    The body is a list of operations like
+
+        {"resource": "persons", "method": "GET", "ids": {"uid": "1"},
+         "query": {"limit": "5"}, "body": {...}}
+
+    and the response lists a status and body per operation, in order.
+    Each operation is authorized for its resource as the middleware would,
+    answering 403 for it alone.
+    Runs of consecutive GETs are read at the same time by at most
+    `workers` threads. With `atomic`, or ?atomic=true, all operations run
+    one after the other in a single transaction, which is rolled back and
+    the rest skipped at the first one failing.
+    """
+    name = 'batch'
+
+    # The resource classes operations can name
+    resources = ()
+
+    workers = 4
+    max_operations = 50
+    atomic = False
+    atomic_name = 'atomic'
+
+    # Request headers operations inherit
+    inherit = ('REMOTE_ADDR', 'HTTP_X_FORWARDED_FOR', 'HTTP_HOST',
+            'SERVER_NAME', 'SERVER_PORT', 'HTTP_AUTHORIZATION')
+
+    # Status of operations skipped after one failed
+    skipped = 424
+
+    # Status of operations on resources the client may not use
+    unauthorized = 403
+
+    # The url keywords operations may give as `ids`
+    id_names = ('uid', 'uids', 'rel')
+
+    Serializer = serializers.Serializer
+
+    def __init__(self, request):
+        self.request = request
+        self.serializer = self.Serializer()
+
+    @classmethod
+    def get_resources(cls):
+        return {resource.get_full_name(): resource
+                for resource in cls.resources}
+
+    def get_operations(self):
+        format = self.Serializer.get_format(
+                self.request.META.get('CONTENT_TYPE') or 'application/json')
+        operations = self.serializer.parse(self.request.body, format)
+
+        if not isinstance(operations, list):
+            raise exceptions.BadRequest("Please send a list of operations")
+        if len(operations) > self.max_operations:
+            raise exceptions.BadRequest("Please send at most {} operations"
+                    .format(self.max_operations))
+
+        resources = self.get_resources()
+        for index, operation in enumerate(operations):
+            if (not isinstance(operation, dict) or
+                    operation.get('resource') not in resources):
+                raise exceptions.BadRequest("Please name one of {} as the "
+                        "resource of operation {}"
+                        .format(', '.join(sorted(resources)), index))
+            self.validate(operation, index)
+        return operations
+
+    def validate(self, operation, index):
+        if not isinstance(operation.get('method', 'GET'), str):
+            raise exceptions.BadRequest("Please name the method of operation "
+                    "{} as a string".format(index))
+
+        ids = operation.get('ids', {})
+        if (not isinstance(ids, dict) or not set(ids) <= set(self.id_names)
+                or not all(isinstance(val, (str, int)) and
+                    not isinstance(val, bool) for val in ids.values())):
+            raise exceptions.BadRequest("Please send the ids of operation {} "
+                    "as an object of {} values"
+                    .format(index, ', '.join(self.id_names)))
+
+        if not isinstance(operation.get('query', {}), dict):
+            raise exceptions.BadRequest("Please send the query of operation "
+                    "{} as an object".format(index))
+
+    def is_atomic(self):
+        flag = self.request.GET.get(self.atomic_name)
+        if flag is None:
+            return self.atomic
+        return flag == 'true'
+
+    def get_request(self, operation):
+        """A request for one operation, made by the same client"""
+        request = HttpRequest()
+        request.method = operation.get('method', 'GET').upper()
+        request.path = self.request.path
+        request.META = {key: self.request.META[key] for key in self.inherit
+                if key in self.request.META}
+        request.META['HTTP_ACCEPT'] = 'application/json'
+        request.META['CONTENT_TYPE'] = 'application/json'
+        request.GET = QueryDict(urlencode(operation.get('query', {})))
+
+        # The body is read from here
+        body = operation.get('body')
+        request._body = b'' if body is None else json.dumps(body).encode('utf-8')
+
+        for attr in ('user', 'session'):
+            if hasattr(self.request, attr):
+                setattr(request, attr, getattr(self.request, attr))
+        return request
+
+    def get_result(self, response):
+        if response.streaming:
+            content = b''.join(response.streaming_content)
+        else:
+            content = response.content
+
+        if not content:
+            body = None
+        elif response.get('Content-Type', '').startswith('application/json'):
+            body = self.serializer.parse_json(content)
+        else:
+            body = str(content, 'utf-8')
+        return {'status': response.status_code, 'body': body}
+
+    def run(self, operation):
+        resource = self.get_resources()[operation['resource']]
+        ids = {key: str(val) for key, val in operation.get('ids', {}).items()}
+        request = self.get_request(operation)
+
+        # Operations don't pass the middleware checking resources
+        try:
+            middleware.authorize(resource, request)
+        except exceptions.Unauthorized as error:
+            return {'status': self.unauthorized, 'body': str(error) or None}
+
+        return self.get_result(resource.view(request, **ids))
+
+    def read(self, operation):
+        """Runs an operation on a thread of the pool"""
+        try:
+            return self.run(operation)
+        finally:
+            connections.close_all()
+
+    def run_atomic(self, operations):
+        results = []
+        with transaction.atomic():
+            for operation in operations:
+                if results and results[-1]['status'] >= 400:
+                    results.append({'status': self.skipped, 'body': None})
+                    continue
+                results.append(self.run(operation))
+            if results and any(result['status'] >= 400 for result in results):
+                transaction.set_rollback(True)
+        return results
+
+    def is_read(self, operation):
+        return operation.get('method', 'GET').upper() == 'GET'
+
+    def read_all(self, pool, operations):
+        if self.workers > 1 and len(operations) > 1:
+            return list(pool.map(self.read, operations))
+        return [self.run(operation) for operation in operations]
+
+    def run_all(self, operations):
+        results = []
+        reads = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for operation in operations:
+                if self.is_read(operation):
+                    reads.append(operation)
+                    continue
+                # Reads before a write run at the same time, then the write
+                results += self.read_all(pool, reads)
+                reads = []
+                results.append(self.run(operation))
+            results += self.read_all(pool, reads)
+        return results
+
+    def act(self):
+        if self.request.method != 'POST':
+            raise exceptions.MethodNotAllowed()
+
+        format = self.Serializer.negotiate(self.request.GET.get('format'),
+                self.request.META.get('HTTP_ACCEPT'))
+        operations = self.get_operations()
+
+        # Lets middleware see how many operations were asked for
+        self.request.operations = operations
+
+        if self.is_atomic():
+            results = self.run_atomic(operations)
+        else:
+            results = self.run_all(operations)
+
+        return self.serializer({'data': results}, format=format)
+
+    @classmethod
+    def view(cls, request):
+        try:
+            return cls(request).act()
+        except exceptions.HttpError as error:
+            response = HttpResponse(str(error), status=error.status)
+            for header, value in error.headers.items():
+                response[header] = value
+            return response
+
+    @classmethod
+    def urls(cls):
+        return (url(cls.name + '$', cls.view, name=cls.name),)
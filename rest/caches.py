@@ -0,0 +1,368 @@
+import time
+import hashlib
+import functools
+import threading
+
+from django.core.cache import caches
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.http import HttpResponse
+
+from .structures import NestedClass
+from .planners import related_models
+from .templates import fingerprint
+
+
+GENERATION_PREFIX = 'rest:generation:'
+
+# The cache holding the generation counters of models
+generations = caches['default']
+
+
+def get_generation_key(model):
+    return GENERATION_PREFIX + model._meta.label_lower
+
+
+def get_generations(models):
+    """The current generation of each model, starting missing ones"""
+    keys = [get_generation_key(model) for model in models]
+    values = generations.get_many(keys)
+    for key in keys:
+        if key not in values:
+            # Start at the time so a counter that was evicted can't go back
+            # to a generation it had before
+            generations.add(key, int(time.time() * 1000), None)
+            values[key] = generations.get(key)
+    return [values[key] for key in keys]
+
+
+def bump(model):
+    key = get_generation_key(model)
+    try:
+        generations.incr(key)
+    except ValueError:
+        generations.add(key, int(time.time() * 1000), None)
+
+
+def on_change(sender, **kwargs):
+    bump(sender)
+
+def on_m2m_change(sender, instance, model, action, **kwargs):
+    if action.startswith('post_'):
+        bump(sender)
+        bump(type(instance))
+        bump(model)
+
+# Models whose changes bump their generation
+watched = set()
+
+def watch(models):
+    """Bumps the generations of the models whenever they change"""
+    for model in models:
+        if model in watched:
+            continue
+        uid = get_generation_key(model)
+        post_save.connect(on_change, sender=model,
+                dispatch_uid=uid + ':post_save')
+        post_delete.connect(on_change, sender=model,
+                dispatch_uid=uid + ':post_delete')
+
+        # Both sides of many to many relations change through their table
+        throughs = [field.remote_field.through
+                for field in model._meta.many_to_many]
+        throughs += [rel.through for rel in model._meta.related_objects
+                if rel.many_to_many]
+        for through in throughs:
+            m2m_changed.connect(on_m2m_change, sender=through,
+                    dispatch_uid=get_generation_key(through) + ':m2m_changed')
+        watched.add(model)
+
+
+class Flight:
+    """A computation in progress, shared by the threads asking for it"""
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+# Flights in progress in this process by key
+flights = {}
+flights_lock = threading.Lock()
+
+
+def single_flight(key, compute, timeout=None):
+    """
+    Runs `compute` once for all threads asking for `key` at the same time.
+
+    Returns whether this thread ran it and the result, which is None for
+    the other threads when it failed or took longer than `timeout`.
+    """
+    with flights_lock:
+        flight = flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = flights[key] = Flight()
+
+    if not leader:
+        flight.done.wait(timeout)
+        return False, flight.result
+
+    try:
+        flight.result = compute()
+    finally:
+        with flights_lock:
+            del flights[key]
+        flight.done.set()
+    return True, flight.result
+
+
+class Cache(NestedClass):
+    """
+    Caches GET responses for `timeout` seconds.
+
+    Keys hold the current generation of the resource's model and of every
+    model its template reads. Saving or deleting any of them bumps its
+    generation, which moves all keys depending on it at once. Only models
+    of resources caching anything are watched for changes, from when the
+    resource class is made or first reads them.
+
+    Identical requests missing the cache at the same time compute the
+    response once: threads of a process wait for the first one, and other
+    processes wait on a lock in the cache. With a `stale` window, expired
+    responses are still served for that many seconds while the request
+    holding the lock refreshes them.
+    """
+    # Seconds a response is cached, 0 to not cache
+    timeout = 0
+
+    # Seconds an expired response is served while it is refreshed
+    stale = 0
+
+    # Seconds to wait on a response another request is computing, and how
+    # often to check on one computed by another process
+    lock_timeout = 10
+    poll = .05
+
+    alias = 'default'
+    prefix = 'rest:response:'
+
+    # Headers kept with the cached content
+    headers = ('Content-Type', 'Vary')
+
+    def get_cache(self):
+        return caches[self.alias]
+
+    def get_models(self, model, template):
+        models = []
+        for related in related_models(model, template):
+            if related not in models:
+                models.append(related)
+        return models
+
+    def watch(self, model, template):
+        """Watches the models a template reads, if anything is cached"""
+        if self.timeout:
+            watch(self.get_models(model, template))
+
+    def get_key(self, resource):
+        models = self.get_models(resource.model, resource.get_template())
+        watch(models)
+        key = repr((
+            resource.get_full_name(),
+            sorted(resource.ids.items()),
+            sorted(resource.query.items()),
+            fingerprint(resource.get_template()),
+            resource.get_format(),
+            resource.permit.scope(resource),
+            get_generations(models),
+        ))
+        return self.prefix + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def dump(self, response):
+        headers = [(header, response[header]) for header in self.headers
+                if response.has_header(header)]
+        return response.status_code, response.content, headers
+
+    def load(self, entry):
+        status, content, headers = entry
+        response = HttpResponse(content, status=status)
+        for header, value in headers:
+            response[header] = value
+        return response
+
+    def cacheable(self, response):
+        return response.status_code == 200 and not response.streaming
+
+    def get_lock_key(self, key):
+        return key + ':lock'
+
+    def compute(self, cache, key, respond):
+        """Responds, returning the response and its entry to share"""
+        response = respond()
+        if not self.cacheable(response):
+            return response, None
+
+        entry = self.dump(response)
+        cache.set(key, (time.time() + self.timeout, entry),
+                self.timeout + self.stale)
+        return response, entry
+
+    def wait(self, cache, key):
+        """Waits for the process holding the lock to cache an entry"""
+        lock = self.get_lock_key(key)
+        deadline = time.time() + self.lock_timeout
+        while time.time() < deadline:
+            time.sleep(self.poll)
+            stored = cache.get(key)
+            if stored is not None and stored[0] > time.time():
+                return stored[1]
+            if cache.get(lock) is None:
+                # Released without caching anything
+                break
+        return None
+
+    def refresh(self, cache, key, respond, stale=None):
+        lock = self.get_lock_key(key)
+        if cache.add(lock, 1, self.lock_timeout):
+            try:
+                return self.compute(cache, key, respond)
+            finally:
+                cache.delete(lock)
+
+        # Another process is computing it
+        if stale is not None:
+            return None, stale
+        entry = self.wait(cache, key)
+        if entry is not None:
+            return None, entry
+        return self.compute(cache, key, respond)
+
+    def __call__(self, resource, respond):
+        if not self.timeout or resource.method != 'GET':
+            return respond()
+
+        cache = self.get_cache()
+        key = self.get_key(resource)
+
+        stale = None
+        stored = cache.get(key)
+        if stored is not None:
+            fresh_until, entry = stored
+            if fresh_until > time.time():
+                return self.load(entry)
+            stale = entry
+
+        if stale is not None and key in flights:
+            # Being refreshed by another thread already
+            return self.load(stale)
+
+        leader, result = single_flight(key,
+                functools.partial(self.refresh, cache, key, respond, stale),
+                self.lock_timeout)
+
+        if leader:
+            response, entry = result
+            return self.load(entry) if response is None else response
+        if result is not None and result[1] is not None:
+            return self.load(result[1])
+
+        # The response could not be shared
+        return respond()
+
+
+class Fragments(Cache):
+    """
+    Caches the encoded JSON of every row of collection GETs for `timeout`
+    seconds, so pages where most rows did not change render just the ones
+    that did.
+
+    A page first reads only the primary key and version of its rows, and
+    fetches their fragments with one `get_many`. The rows missing are
+    loaded, rendered and encoded, and all fragments are spliced into the
+    response in page order.
+
+    Fragments are keyed on the row's `version_field`, or `modified_field`
+    when there is none, so resources without either are rendered as
+    usual. Other models the template reads are covered by their
+    generation, as in `Cache`.
+    """
+    prefix = 'rest:fragment:'
+
+    def get_version_field(self, resource):
+        return resource.version_field or resource.modified_field
+
+    def applies(self, resource, format):
+        return bool(self.timeout and format == 'json'
+                and resource.method == 'GET' and 'uid' not in resource.ids
+                and not resource.stream
+                and self.get_version_field(resource) is not None)
+
+    def get_scope(self, resource):
+        """The part of the keys shared by all rows of a page"""
+        template = resource.get_template()
+        models = self.get_models(resource.model, template)
+        watch(models)
+
+        # The versions of the rows themselves stand in for the generation
+        # of the resource's model
+        models = models[1:]
+
+        return (
+            resource.get_full_name(),
+            fingerprint(template),
+            get_generations(models),
+        )
+
+    def get_key(self, scope, pk, version):
+        key = repr((scope, pk, version))
+        return self.prefix + hashlib.md5(key.encode('utf-8')).hexdigest()
+
+    def get_pk(self, row, pk):
+        if isinstance(row, dict):
+            return row[pk]
+        return row.pk
+
+    def render(self, resource, pks):
+        """Encoded fragments of the rows with the given primary keys"""
+        serializer = resource.get_serializer()
+        pk = resource.model._meta.pk.attname
+
+        rows = list(resource.prepare(resource.queryset.filter(pk__in=pks)))
+        rendered = resource.dehydrate(resource.render(rows))
+
+        return {self.get_pk(row, pk): serializer.json(item)
+                for row, item in zip(rows, rendered)}
+
+    def __call__(self, resource):
+        version = self.get_version_field(resource)
+        pk = resource.model._meta.pk.attname
+
+        columns = [pk, version]
+        for column in resource.slice.get_columns(resource):
+            if column not in columns:
+                # What keyset slicers order on
+                columns.append(column)
+
+        collection = resource.get_collection().values(*columns)
+        page, meta = resource.slice(resource, collection)
+        page = list(page)
+        resource.rows = len(page)
+
+        scope = self.get_scope(resource)
+        keys = [self.get_key(scope, row[pk], row[version])
+                for row in page]
+
+        cache = self.get_cache()
+        fragments = cache.get_many(keys)
+
+        misses = [row[pk] for row, key in zip(page, keys)
+                if key not in fragments]
+        if misses:
+            rendered = self.render(resource, misses)
+            fresh = {}
+            for row, key in zip(page, keys):
+                if key not in fragments and row[pk] in rendered:
+                    fresh[key] = rendered[row[pk]]
+            cache.set_many(fresh, self.timeout)
+            fragments.update(fresh)
+
+        return resource.get_serializer().splice(
+                [fragments[key] for key in keys if key in fragments], meta)
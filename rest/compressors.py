@@ -0,0 +1,154 @@
+import zlib
+
+from django.utils.cache import patch_vary_headers
+
+from .structures import NestedClass
+from .serializers import parse_accept
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Deflater:
+    """Incremental gzip or zlib (HTTP deflate) compression"""
+    def __init__(self, level, wbits):
+        self.obj = zlib.compressobj(level, zlib.DEFLATED, wbits)
+
+    def compress(self, data):
+        return self.obj.compress(data)
+
+    def flush(self):
+        return self.obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.obj.flush(zlib.Z_FINISH)
+
+
+class Brotli:
+    def __init__(self, level):
+        self.obj = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.obj.process(data)
+
+    def flush(self):
+        return self.obj.flush()
+
+    def finish(self):
+        return self.obj.finish()
+
+
+class Zstandard:
+    def __init__(self, level):
+        self.obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.obj.compress(data)
+
+    def flush(self):
+        return self.obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.obj.flush()
+
+
+class Compressor(NestedClass):
+    """
+    Compresses responses with the content coding the client accepts best,
+    preferring the order of `encodings` on ties.
+
+    Regular responses smaller than `min_size` bytes are sent as they are.
+    Streamed responses are compressed a piece at a time, flushing after
+    every piece so clients can decode rows as they arrive.
+    """
+    encodings = ('br', 'zstd', 'gzip', 'deflate')
+
+    # Compression level per content coding
+    levels = {
+        'br': 4,
+        'zstd': 3,
+        'gzip': 6,
+        'deflate': 6,
+    }
+
+    min_size = 1024
+
+    def available(self):
+        for coding in self.encodings:
+            if coding == 'br' and brotli is None:
+                continue
+            if coding == 'zstd' and zstandard is None:
+                continue
+            yield coding
+
+    def negotiate(self, accept_encoding):
+        qualities = dict(parse_accept(accept_encoding))
+
+        best, best_quality = None, 0
+        for coding in self.available():
+            quality = qualities.get(coding, qualities.get('*', 0))
+            if quality > best_quality:
+                best, best_quality = coding, quality
+        return best
+
+    def get_compressor(self, coding):
+        level = self.levels[coding]
+        if coding == 'gzip':
+            return Deflater(level, 16 + zlib.MAX_WBITS)
+        elif coding == 'deflate':
+            return Deflater(level, zlib.MAX_WBITS)
+        elif coding == 'br':
+            return Brotli(level)
+        elif coding == 'zstd':
+            return Zstandard(level)
+
+    def compress(self, coding, content):
+        compressor = self.get_compressor(coding)
+        return compressor.compress(content) + compressor.finish()
+
+    def compress_stream(self, coding, pieces):
+        compressor = self.get_compressor(coding)
+        for piece in pieces:
+            compressed = compressor.compress(piece) + compressor.flush()
+            if compressed:
+                yield compressed
+        yield compressor.finish()
+
+    def __call__(self, request, response):
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        coding = self.negotiate(accept_encoding) if accept_encoding else None
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = self.compress_stream(coding,
+                    response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            compressed = self.compress(coding, response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # The compressed body is no longer byte for byte the same
+        etag = response.get('ETag')
+        if etag and not etag.startswith('W/'):
+            response['ETag'] = 'W/' + etag
+
+        response['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,143 @@
+import hashlib
+
+from django.db.models import Count, Max, Min, Sum
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from .structures import NestedClass
+from .templates import fingerprint
+
+
+def parse_etags(header):
+    """The entity tags of an If-None-Match or If-Match header, unweakened"""
+    etags = []
+    for etag in header.split(','):
+        etag = etag.strip()
+        if etag.startswith('W/'):
+            etag = etag[2:]
+        if etag:
+            etags.append(etag)
+    return etags
+
+
+class Condition(NestedClass):
+    """
+    Computes the validators of a GET from the resource's `version_field`
+    and `modified_field` with one small query, and answers a matching
+    If-None-Match or If-Modified-Since with 304 before any rows are loaded
+    or serialized.
+
+    One object is validated by its version or modification time. A
+    collection is validated by the sum of its versions, which grows with
+    every bump of any row, or the latest modification time, along with the
+    number of rows of the filtered queryset and its lowest and highest key.
+    """
+    methods = ('GET', 'HEAD')
+
+    def get_variant(self, resource):
+        """A digest of what else shapes the representation"""
+        variant = repr((
+            resource.get_format(),
+            fingerprint(resource.get_template()),
+            sorted(resource.query.items()),
+        ))
+        return hashlib.md5(variant.encode('utf-8')).hexdigest()[:8]
+
+    def get_fields(self, resource):
+        return [field for field in (resource.version_field,
+                resource.modified_field) if field]
+
+    def get_one(self, resource):
+        fields = self.get_fields(resource)
+        row = (resource.get_permitted()
+                .filter(**resource.get_ids())
+                .values_list(*fields)
+                .first())
+        if row is None:
+            return None, None
+
+        values = dict(zip(fields, row))
+        modified = values.get(resource.modified_field)
+        if resource.version_field:
+            tag = str(values[resource.version_field])
+        else:
+            tag = hashlib.md5(str(modified).encode('utf-8')).hexdigest()
+        return tag, modified
+
+    def get_many(self, resource):
+        # A row deleted and another inserted move the lowest or highest key
+        aggregates = {'count': Count('pk'), 'first': Min('pk'),
+                'last': Max('pk')}
+        if resource.version_field:
+            aggregates['version'] = Sum(resource.version_field)
+        if resource.modified_field:
+            aggregates['modified'] = Max(resource.modified_field)
+
+        values = resource.get_collection().aggregate(**aggregates)
+        tag = repr((values['count'], values['first'], values['last'],
+            values.get('version'), values.get('modified')))
+        tag = hashlib.md5(tag.encode('utf-8')).hexdigest()
+        return tag, values.get('modified')
+
+    def get_validators(self, resource):
+        """Returns the ETag and the modification time, if any"""
+        if not self.get_fields(resource):
+            return None, None
+
+        if 'uid' in resource.ids:
+            tag, modified = self.get_one(resource)
+        else:
+            tag, modified = self.get_many(resource)
+
+        if tag is None:
+            return None, None
+
+        etag = '"{}.{}"'.format(tag, self.get_variant(resource))
+        return etag, modified
+
+    def get_if_match(self, request):
+        """The tags an If-Match header names, without their variants"""
+        header = request.META.get('HTTP_IF_MATCH')
+        if not header:
+            return None
+
+        tags = []
+        for etag in parse_etags(header):
+            if etag == '*':
+                tags.append(etag)
+            else:
+                tags.append(etag.strip('"').rpartition('.')[0])
+        return tags
+
+    def not_modified(self, request, etag, modified):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return etag is not None and ('*' in etags or etag in etags)
+
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since and modified is not None:
+            since = parse_http_date_safe(if_modified_since)
+            return since is not None and int(modified.timestamp()) <= since
+
+        return False
+
+    def __call__(self, resource, respond):
+        if resource.method not in self.methods:
+            return respond()
+
+        etag, modified = self.get_validators(resource)
+
+        if self.not_modified(resource.request, etag, modified):
+            response = HttpResponseNotModified()
+            patch_vary_headers(response, ('Accept',))
+        else:
+            response = respond()
+
+        if etag is not None:
+            response['ETag'] = etag
+        if modified is not None:
+            response['Last-Modified'] = http_date(modified.timestamp())
+
+        return response
@@ -0,0 +1,180 @@
+import json
+import hashlib
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+
+class Counter:
+    """
+    Counts a collection with a separate SELECT COUNT(*)
+
+    Counters are called by a slicer with the filtered collection and return
+    the page of rows, the count, the kind of count it is and whether there
+    are more rows after the page.
+    """
+    name = 'exact'
+
+    def count(self, slicer, collection):
+        return slicer.get_count(collection), self.name
+
+    def fetch(self, slicer, collection, limit, offset):
+        """Find out if there is a next page by fetching one extra row"""
+        if limit is None:
+            return slicer.get_slice(collection, limit, offset), False
+        rows = list(slicer.get_slice(collection, limit + 1, offset))
+        return rows[:limit], len(rows) > limit
+
+    def __call__(self, slicer, collection, limit, offset):
+        count, kind = self.count(slicer, collection)
+        rows = slicer.get_slice(collection, limit, offset)
+        more = limit is not None and offset + limit < count
+        return rows, count, kind, more
+
+
+class NoCounter(Counter):
+    """Skips counting altogether"""
+    name = 'none'
+
+    def count(self, slicer, collection):
+        return None, self.name
+
+    def __call__(self, slicer, collection, limit, offset):
+        rows, more = self.fetch(slicer, collection, limit, offset)
+        return rows, None, self.name, more
+
+
+class CachedCounter(Counter):
+    """
+    Caches exact counts for `slicer.count_timeout` seconds, keyed on the
+    SQL of the filtered collection
+    """
+    name = 'cached'
+    prefix = 'rest:count:'
+
+    def get_key(self, collection):
+        sql, params = collection.query.sql_with_params()
+        key = repr((collection.db, sql, params)).encode('utf-8')
+        return self.prefix + hashlib.md5(key).hexdigest()
+
+    def count(self, slicer, collection):
+        try:
+            key = self.get_key(collection)
+        except Exception:
+            # Not a QuerySet, or one that can't match anything, which are
+            # counted exactly
+            return slicer.get_count(collection), Counter.name
+
+        count = cache.get(key)
+        if count is None:
+            count = slicer.get_count(collection)
+            cache.set(key, count, slicer.count_timeout)
+        return count, self.name
+
+    def __call__(self, slicer, collection, limit, offset):
+        count, kind = self.count(slicer, collection)
+        rows, more = self.fetch(slicer, collection, limit, offset)
+        return rows, count, kind, more
+
+
+class EstimatedCounter(Counter):
+    """
+    Reads the row estimate from the query planner on backends that offer
+    one, and counts exactly elsewhere
+    """
+    name = 'estimated'
+
+    def estimate(self, collection):
+        connection = connections[collection.db]
+        if connection.vendor != 'postgresql':
+            return None
+
+        sql, params = collection.query.sql_with_params()
+        cursor = connection.cursor()
+        try:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def count(self, slicer, collection):
+        try:
+            count = self.estimate(collection)
+        except AttributeError:
+            # Not a QuerySet
+            count = None
+        except EmptyResultSet:
+            # A QuerySet that can't match anything, like none()
+            return 0, Counter.name
+        if count is None:
+            # No estimate on this backend
+            return slicer.get_count(collection), Counter.name
+        return count, self.name
+
+    def __call__(self, slicer, collection, limit, offset):
+        count, kind = self.count(slicer, collection)
+        rows, more = self.fetch(slicer, collection, limit, offset)
+        return rows, count, kind, more
+
+
+class WindowCounter(Counter):
+    """
+    Takes the exact count from the page query itself with COUNT(*) OVER ()
+    on backends supporting window functions
+    """
+    name = 'window'
+    column = '_window_count'
+
+    vendors = ('postgresql', 'oracle')
+
+    def supported(self, collection):
+        try:
+            connection = connections[collection.db]
+        except AttributeError:
+            return False
+        return getattr(connection.features, 'supports_over_clause',
+                connection.vendor in self.vendors)
+
+    def pop_count(self, row):
+        if isinstance(row, dict):
+            return row.pop(self.column)
+        count = getattr(row, self.column)
+        delattr(row, self.column)
+        return count
+
+    def __call__(self, slicer, collection, limit, offset):
+        if not self.supported(collection):
+            return super().__call__(slicer, collection, limit, offset)
+
+        windowed = collection.extra(select={self.column: 'COUNT(*) OVER ()'})
+        if getattr(collection, '_fields', None):
+            # values() only selects the extra columns it names
+            windowed = windowed.values(*(collection._fields + (self.column,)))
+        rows = list(slicer.get_slice(windowed, limit, offset))
+
+        if rows:
+            count = None
+            for row in rows:
+                count = self.pop_count(row)
+        elif offset:
+            # Paged beyond the end, there is no row to read the count from
+            count = slicer.get_count(collection)
+        else:
+            count = 0
+
+        more = limit is not None and offset + limit < count
+        return rows, count, self.name, more
+
+
+counters = {counter.name: counter() for counter in (
+    Counter,
+    NoCounter,
+    CachedCounter,
+    EstimatedCounter,
+    WindowCounter,
+)}
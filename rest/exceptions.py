@@ -1,3 +1,48 @@
+import json
+
 class Error(Exception): pass
 class Unauthorized(Exception): pass
 class ThrottleException(Exception): pass
+
+class HttpError(Error):
+    status = 500
+
+    # Extra headers of the response
+    headers = {}
+
+class BadRequest(HttpError):
+    status = 400
+
+class ValidationError(BadRequest):
+    """Carries the error messages by key, or by index for lists"""
+    headers = {'Content-Type': 'application/json'}
+
+    def __init__(self, errors):
+        super().__init__(json.dumps(errors))
+        self.errors = errors
+
+class Forbidden(HttpError):
+    status = 403
+
+class NotFound(HttpError):
+    status = 404
+
+class MethodNotAllowed(HttpError):
+    status = 405
+
+class NotAcceptable(HttpError):
+    status = 406
+
+class PreconditionFailed(HttpError):
+    status = 412
+
+class UnsupportedMediaType(HttpError):
+    status = 415
+
+class ServiceUnavailable(HttpError):
+    status = 503
+
+    def __init__(self, message='', retry_after=None):
+        super().__init__(message)
+        if retry_after is not None:
+            self.headers = {'Retry-After': str(retry_after)}
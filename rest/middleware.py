@@ -1,36 +1,128 @@
 import math
+import time
+import functools
+import itertools
+import threading
 
-from django.utils import timezone
-from django.core.cache import cache
+from django.core.cache import caches
 from django.http import HttpResponse
 
-from . import models
 from . import exceptions
+from .structures import Closing
+
+
+def get_resource(view_func):
+    """The resource class a view belongs to, None for other views"""
+    from .resources import Resource
+
+    resource = getattr(view_func, '__self__', None)
+    if isinstance(resource, type) and issubclass(resource, Resource):
+        return resource
+    return None
+
+
+def is_batch(view_func):
+    from .batch import Batch
+
+    batch = getattr(view_func, '__self__', None)
+    return isinstance(batch, type) and issubclass(batch, Batch)
+
 
 # Authentication
+def authorize(resource, request):
+    """Raises Unauthorized when the request may not use the resource"""
+    # Check if resource requires authenticated user
+    try:
+        if resource.login_required and not request.user.is_authenticated():
+            raise exceptions.Unauthorized
+    except AttributeError:
+        pass
+
+    # Call custom is_unauthorized on resource if present
+    try:
+        if resource.is_unauthorized():
+            raise exceptions.Unauthorized
+    except AttributeError:
+        pass
+
+
 class AuthenticationMiddelware:
     def process_view(self, request, view_func, view_args, view_kwargs):
         # Skip if we're not dealing with a resource
-        if not isinstance(view_func, Resource):
+        resource = get_resource(view_func)
+        if resource is None:
             return
 
-        # Check if resource requires authenticated user
-        try:
-            if view_func.login_required and not request.user.is_authenticated():
-                raise exceptions.Unauthorized
-        except AttributeError:
-            pass
-
-        # Call custom is_unauthorized on resource if present
-        try:
-            if view_func.is_unauthorized():
-                raise exceptions.Unauthorized
-        except AttributeError:
-            pass
+        authorize(resource, request)
 
     def process_exception(self, request, exception):
         if isinstance(exception, exceptions.Unauthorized):
-            return HttpResponse(exception.msg, status=403)
+            return HttpResponse(str(exception), status=403)
+
+
+class LocalCache:
+    """
+    Holds throttle buckets in this process in stead of a shared cache, for
+    single process deployments and tests. Timeouts are ignored.
+    """
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value, timeout=None):
+        with self.lock:
+            self.values[key] = value
+
+    def add(self, key, value, timeout=None):
+        with self.lock:
+            if key in self.values:
+                return False
+            self.values[key] = value
+            return True
+
+    def incr(self, key, delta=1):
+        with self.lock:
+            if key not in self.values:
+                raise ValueError("Key '{}' not found".format(key))
+            value = self.values[key] = self.values[key] + delta
+            return value
+
+    def decr(self, key, delta=1):
+        return self.incr(key, -delta)
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Lease:
+    """Points taken from a shared bucket to spend in this process"""
+    def __init__(self, points, full, expires, spent=0):
+        self.points = points
+        self.full = full
+        self.expires = expires
+        self.spent = spent
+
+        # next() on a count is atomic, so threads spend without a lock
+        self.counter = itertools.count(spent + 1)
+        self.renewals = itertools.count()
+
+    def spend(self, cost):
+        spent = self.spent
+        for i in range(math.ceil(cost)):
+            spent = next(self.counter)
+        self.spent = spent
+        return spent
+
+    def left(self):
+        return max(self.points - self.spent, 0)
 
 
 # Throttle
@@ -39,6 +131,25 @@ class Throttle:
     Throttler is the Keeper of the Bandwith.
     He manages rate limits of users. And replenishes shares of those
     in fixed intervals.
+
+    Every client has a bucket of at most `pool` points, regaining `gain`
+    points per `interval`, and every request to a resource takes `cost`.
+    A bucket is kept as a single number, the time in microseconds at which
+    it is full again, so taking points is one atomic `incr` of the cache.
+
+    A bucket that was full is set to now in stead, and requests taking
+    from the same full bucket at the same moment may overwrite each other
+    there, letting at most that many requests more through.
+
+    With a `lease`, a process takes that many points of a client at once
+    and spends them without going to the cache, taking the next lease in
+    the background once a `renew` fraction of it is left. While that is
+    under way, clients may spend up to `tolerance` points more, which the
+    next lease pays back; that is how far a process can go over the
+    limit. Leases are given back after `lease_time` seconds, and near the
+    limit, where a whole lease can't be taken, points are taken one
+    request at a time again. Expired leases of clients that didn't come
+    back are given back and forgotten every `lease_time` seconds.
     """
     # in seconds
     interval = 60 * 60
@@ -52,101 +163,243 @@ class Throttle:
     # number of points replenished per interval
     gain = 300
 
-    def replenish_amount(self, delta):
-        return delta * self.gain // self.interval
-
-    def full_replenish_time(self, value):
-        return math.ceil((self.pool - value) / self.gain) * interval
-
-    class Pool:
-        STAMP_SUFFIX = '__throttle_stamp'
-        VALUE_SUFFIX = '__throttle_value'
-
-        def __init__(self, request, throttle):
-            self.throttle = throttle
-            self.request = request
-
-            self.value = self.get_value(request, throttle)
-
-            self.init(request, throttle)
-
-        def __add__(self, other):
-            if not isinstance(other, int):
-                raise TypeError
-            stamp = timezone.now()
-            delta = stamp - self.timestamp
-            gain = self.throttle.replenish_amount(delta)
-            value = self.value + gain
-            new = value + other
-            if new < 0:
-                self.set_value(value, stamp)
-                raise exceptions.ThrottleException()
+    # Points charged after the response on top of `cost`: per row of the
+    # page asked for, per filter applied unless the Filter method sets its
+    # own with `structures.cost`, and per second the request took
+    row_cost = 0
+    filter_cost = 0
+    time_cost = 0
 
-            self.set_value(new, stamp)
-            return self
+    # The cache holding the buckets, None for a cache local to the process
+    alias = 'default'
+    prefix = 'rest:throttle:'
 
-        def __iadd__(self, other):
-            return self + other
+    local = LocalCache()
 
-        def __sub__(self, other):
-            return self + -other
+    # Points to lease per process and client, 0 to not lease
+    lease = 0
+    renew = .25
+    tolerance = 0
+    lease_time = 10
 
-        def __isub__(self, other):
-            return self + -other
+    def __init__(self):
+        # Leases of this process by key
+        self.leases = {}
+        self.swept = 0
 
-        def init(self):
-            self.cache = cache
+    def get_cache(self):
+        if self.alias is None:
+            return self.local
+        return caches[self.alias]
 
-        def get_key(self, request):
-            x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-            if x_forwarded_for:
-                ip = x_forwarded_for.split(',')[-1].strip()
-            else:
-                ip = request.META.get('REMOTE_ADDR')
-            return ip
-
-        def _get(self, request):
-
-        def get_timestamp(self, request, throttle):
-            return self.cache.get(cls.get_key(request) + STAMP_SUFFIX, throttle.pool)
-
-        def get_value(self, request, throttle):
-            return self.cache.get(cls.get_key(request) + VALUE_SUFFIX, throttle.pool)
-
-        def _set(self, request, value, stamp):
-            expire = self.throttle.full_replenish_time(value)
-            stamp = stamp or timezone.now()
-            self.set_value(key, value, expire)
-            self.set_timestamp(key, stamp, expire)
-
-        def set_value(self, key, value, expire=None):
-            self.cache.set(key + VALUE_SUFFIX, value, expire)
-
-        def set_timestamp(self, key, stamp, expire):
-            self.cache.set(key + STAMP_SUFFIX, stamp, expire)
+    def get_key(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated():
+            return self.prefix + 'user:{}'.format(user.pk)
 
-
-
-    def get_current(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
+            ip = x_forwarded_for.split(',')[-1].strip()
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip
-
-    def replenish(self, prev, current, timestamp)
-        return
-
-
-    def __call__(self, request):
-        pool = self.pool(request, self)
-
+        return self.prefix + 'ip:{}'.format(ip)
 
+    def get_cost(self, request, resource):
+        return self.cost
 
+    def get_rows(self, resource):
+        """The rows a request read"""
+        if 'uid' in resource.ids or resource.method != 'GET':
+            return 1
+        try:
+            rows = resource.rows
+        except AttributeError:
+            # Failed before reading any
+            return 1
+        if rows is None:
+            # A page that wasn't counted
+            rows = resource.rendered
+        return rows
+
+    def get_filter_costs(self, resource):
+        for name, method in resource.filter._table():
+            if name in resource.query:
+                yield getattr(method, 'cost', self.filter_cost)
+
+    def measure(self, request, resource, elapsed):
+        """What a request cost, once it was answered"""
+        rows = self.get_rows(resource) if self.row_cost else 0
+        return (self.get_cost(request, resource)
+                + rows * self.row_cost
+                + sum(self.get_filter_costs(resource))
+                + elapsed * self.time_cost)
+
+    def charge(self, key, cost):
+        """Takes points from a bucket whether it has them or not"""
+        cache = self.get_cache()
+        amount = int(cost * self.get_step())
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.add(key, self.now() + amount, None)
+
+    def now(self):
+        return int(time.time() * 1000000)
+
+    def get_step(self):
+        """Microseconds it takes to regain a point"""
+        return self.interval * 1000000 // self.gain
+
+    def take(self, key, cost):
+        """
+        Takes `cost` points from a bucket, returning whether it had them,
+        the time it is full again and the current time
+        """
+        cache = self.get_cache()
+        now = self.now()
+        amount = int(cost * self.get_step())
 
-# Permissions
-class PermissionsMiddleware:
-    pass
+        try:
+            full = cache.incr(key, amount)
+        except ValueError:
+            if cache.add(key, now + amount, None):
+                full = now + amount
+            else:
+                full = cache.incr(key, amount)
+        else:
+            if full - amount < now:
+                # A full bucket doesn't get any fuller
+                full = now + amount
+                cache.set(key, full, None)
+
+        if full - now > self.pool * self.get_step():
+            # Give the points back
+            cache.decr(key, amount)
+            return False, full - amount, now
+        return True, full, now
+
+    def take_lease(self, key, old=None):
+        """Replaces a lease by a new one, or an empty one when the bucket
+        doesn't hold enough points"""
+        leases = self.leases
+        allowed, full, now = self.take(key, self.lease)
+
+        # Points left over or spent beyond the old lease carry over
+        spent = 0
+        if old is not None:
+            if now >= old.expires and old.left() and leases.get(key) is old:
+                # Give back what was not spent in time
+                self.get_cache().decr(key, old.left() * self.get_step())
+                spent = max(old.spent - old.points, 0)
+            else:
+                spent = min(old.spent - old.points, self.tolerance)
+
+        expires = now + self.lease_time * 1000000
+        if allowed:
+            lease = leases[key] = Lease(self.lease, full, expires, spent)
+        elif old is not None and now < old.expires:
+            # Spend what is left of the old one
+            lease = old
+        else:
+            # Take points per request until it expires, owing what was
+            # spent beyond the old one to the next lease
+            lease = leases[key] = Lease(0, full, expires, spent)
+        return lease
+
+    def renew_lease(self, key, lease):
+        if next(lease.renewals) == 0:
+            thread = threading.Thread(target=self.take_lease,
+                    args=(key, lease))
+            thread.daemon = True
+            thread.start()
+
+    def sweep(self, now):
+        """Gives back the points of expired leases and forgets them"""
+        self.swept = now
+        for key, lease in list(self.leases.items()):
+            if now >= lease.expires and self.leases.pop(key, None) is lease:
+                if lease.left():
+                    self.get_cache().decr(key, lease.left() * self.get_step())
+
+    def take_leased(self, key, cost):
+        now = self.now()
+        if now >= self.swept + self.lease_time * 1000000:
+            self.sweep(now)
+
+        lease = self.leases.get(key)
+        if lease is None or now >= lease.expires:
+            lease = self.take_lease(key, lease)
+
+        if lease.points:
+            spent = lease.spend(cost)
+            if spent <= lease.points + self.tolerance:
+                if lease.points - spent < lease.points * self.renew:
+                    self.renew_lease(key, lease)
+                full = lease.full - lease.left() * self.get_step()
+                return True, full, now
+
+        # Without a lease nothing is tolerated
+        return self.take(key, cost)
+
+    def get_headers(self, allowed, full, now, cost):
+        step = self.get_step()
+        remaining = max(self.pool * step - (full - now), 0) // step
+        headers = {
+            'X-RateLimit-Limit': str(self.pool),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(math.ceil(full / 1000000)),
+        }
+        if not allowed:
+            wait = full + cost * step - self.pool * step - now
+            headers['Retry-After'] = str(max(math.ceil(wait / 1000000), 1))
+        return headers
 
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        resource = get_resource(view_func)
+        if resource is None and not is_batch(view_func):
+            return
 
+        key = self.get_key(request)
+        cost = self.get_cost(request, resource)
+        if self.lease:
+            allowed, full, now = self.take_leased(key, cost)
+        else:
+            allowed, full, now = self.take(key, cost)
+        request.rate_limit = self.get_headers(allowed, full, now, cost)
+        request.throttle = key, cost, time.time()
+
+        if not allowed:
+            response = HttpResponse('Too many requests', status=429)
+            for header, value in request.rate_limit.items():
+                response[header] = value
+            return response
+
+    def settle(self, request, resource):
+        """Charges what a request cost beyond what it took up front"""
+        key, cost, started = request.throttle
+        extra = self.measure(request, resource, time.time() - started) - cost
+        if extra > 0:
+            self.charge(key, extra)
+
+    def process_response(self, request, response):
+        resource = getattr(request, 'resource', None)
+        throttle = getattr(request, 'throttle', None)
+        if resource is not None and throttle is not None:
+            if response.streaming:
+                # Streamed rows are read and rendered while they are sent
+                response.streaming_content = Closing(
+                        response.streaming_content,
+                        functools.partial(self.settle, request, resource))
+            else:
+                self.settle(request, resource)
+
+        operations = getattr(request, 'operations', None)
+        if operations and throttle is not None:
+            # Batches pay for every operation they ran
+            key, cost, started = throttle
+            self.charge(key, cost * (len(operations) - 1))
+
+        for header, value in getattr(request, 'rate_limit', {}).items():
+            if not response.has_header(header):
+                response[header] = value
+        return response
@@ -0,0 +1,46 @@
+from .structures import NestedClass
+
+
+class Permission(NestedClass):
+    """
+    Limits the rows a request can see or change with a Q object, applied
+    to the queryset before it is counted, sliced or written to, so no row
+    is checked one at a time.
+
+    Rules are methods named after the request method, or else `read` for
+    safe methods and `write` for others. They take the resource and return
+    a Q of the rows allowed, True or None for all rows or False for none.
+
+        def read(self, resource):
+            return Q(public=True) | Q(owner=resource.request.user.pk)
+
+        def DELETE(self, resource):
+            return resource.request.user.is_staff
+    """
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def get_rule(self, method):
+        rule = getattr(self, method, None)
+        if rule is None:
+            rule = getattr(self,
+                    'read' if method in self.safe_methods else 'write', None)
+        return rule
+
+    def get_q(self, resource):
+        rule = self.get_rule(resource.method)
+        if rule is None:
+            return None
+        return rule(resource)
+
+    def scope(self, resource):
+        """Tells apart requests that may see different rows"""
+        q = self.get_q(resource)
+        return None if q is None or q is True else str(q)
+
+    def __call__(self, resource, queryset):
+        q = self.get_q(resource)
+        if q is None or q is True:
+            return queryset
+        if q is False:
+            return queryset.none()
+        return queryset.filter(q)
@@ -0,0 +1,127 @@
+import functools
+
+from django.db.models import Prefetch
+
+from .structures import NestedClass
+
+
+@functools.lru_cache(maxsize=None)
+def get_fields(model):
+    """Maps field names and reverse accessor names to fields"""
+    fields = {}
+    for field in model._meta.get_fields():
+        if field.auto_created and not field.concrete:
+            fields[field.get_accessor_name()] = field
+        else:
+            fields[field.name] = field
+    return fields
+
+
+def get_field(model, name):
+    return get_fields(model).get(name)
+
+
+def is_join(field):
+    """Whether the relation can be followed with select_related"""
+    return field.one_to_one or (field.many_to_one and field.concrete)
+
+
+class Planner(NestedClass):
+    """
+    Derives select_related, prefetch_related and only() from a built
+    template, so a page costs the same number of queries regardless of its
+    size.
+
+    Forward foreign keys and one to one relations are joined, other
+    relations are prefetched with a planned queryset of their own. Columns
+    are only restricted when every level reached by joins lists its fields
+    explicitly and has no hooks that might touch others.
+    """
+    def __call__(self, queryset, template, required=()):
+        joins, prefetches, columns = self.plan(queryset.model, template)
+
+        if joins:
+            queryset = queryset.select_related(*joins)
+        if prefetches:
+            queryset = queryset.prefetch_related(*prefetches)
+        if columns is not None:
+            queryset = queryset.only(*(columns + list(required)))
+
+        return queryset
+
+    def get_columns(self, model, template):
+        if 'fields' not in template:
+            return None
+        if 'prehook' in template or 'posthook' in template:
+            return None
+
+        aliases = template.get('aliases', {})
+        names = [aliases.get(name, name) for name in template['fields']]
+
+        columns = [model._meta.pk.name]
+        fields = get_fields(model)
+        for name in names:
+            if name == 'pk':
+                continue
+            field = fields.get(name)
+            if field is None or not field.concrete:
+                if name in template.get('related', {}):
+                    continue
+                # Something we can't see through, like a property
+                return None
+            columns.append(name)
+
+        return columns
+
+    def plan(self, model, template, prefix=''):
+        joins = []
+        prefetches = []
+        columns = self.get_columns(model, template)
+        if columns is not None:
+            columns = [prefix + column for column in columns]
+
+        for name, related in template.get('related', {}).items():
+            field = get_field(model, name)
+            if field is None or field.related_model is None:
+                continue
+
+            if not hasattr(related, 'get'):
+                related = {}
+
+            if is_join(field):
+                path = prefix + name + '__'
+                sub_joins, sub_prefetches, sub_columns = self.plan(
+                        field.related_model, related, path)
+
+                joins.append(prefix + name)
+                joins += sub_joins
+                prefetches += sub_prefetches
+
+                if columns is not None and sub_columns is not None:
+                    if field.concrete:
+                        columns.append(prefix + name)
+                    columns += sub_columns
+                else:
+                    columns = None
+            else:
+                required = ()
+                if field.one_to_many:
+                    # The reverse foreign key is needed to match rows up
+                    required = (field.field.name,)
+                queryset = field.related_model._default_manager.all()
+                queryset = self(queryset, related, required)
+                prefetches.append(Prefetch(prefix + name, queryset=queryset))
+
+        return joins, prefetches, columns
+
+
+def related_models(model, template):
+    """Yields the models a template reads, starting with `model`"""
+    yield model
+    for name, related in template.get('related', {}).items():
+        field = get_field(model, name)
+        if field is None or field.related_model is None:
+            continue
+        if not hasattr(related, 'get'):
+            related = {}
+        yield from related_models(field.related_model, related)
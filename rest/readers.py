@@ -0,0 +1,168 @@
+import functools
+from collections import namedtuple, defaultdict
+
+from .structures import NestedClass
+from .planners import get_fields, is_join
+
+
+# How to build output rows for a template from values() rows
+#   columns: (key, column) pairs copied from the values row
+#   joins: (key, column, plan) nested rows over a joined relation, where
+#       `column` holds its foreign key
+#   lists: (key, field, fields, flat) to-many values lists read with one
+#       extra grouped query per page
+Plan = namedtuple('Plan', 'columns joins lists')
+
+# Template options the reader does not emulate
+UNSUPPORTED = ('exclude', 'prefix', 'merge', 'camelcase', 'prehook',
+        'posthook')
+
+
+class Reader(NestedClass):
+    """
+    Reads rows straight from values() for templates that only use plain
+    columns, skipping model instantiation and undjango.
+
+    Supported templates list their `fields`, aliases point at columns, and
+    related templates either follow a foreign key and are supported
+    themselves, or are flat `values_list` templates of a to-many relation.
+    """
+    # Compiled plans by (model, template), None when not supported, for
+    # up to `max_plans` of the most recently used
+    max_plans = 256
+    _plans = None
+
+    def get_plan(self, model, template):
+        if self._plans is None:
+            self._plans = functools.lru_cache(maxsize=self.max_plans)(
+                    self.compile)
+        return self._plans(model, template)
+
+    def supports(self, model, template):
+        return self.get_plan(model, template) is not None
+
+    def compile(self, model, template, prefix='', nested=False):
+        if 'fields' not in template:
+            return None
+        if any(key in template for key in UNSUPPORTED):
+            return None
+        if template.get('values_list'):
+            return None
+
+        fields = get_fields(model)
+        related = template.get('related', {})
+
+        columns = []
+        joins = []
+        lists = []
+
+        # Aliases name the attribute a listed field reads
+        aliases = template.get('aliases', {})
+        names = [(name, aliases.get(name, name)) for name in template['fields']]
+
+        for key, name in names:
+            if name == 'pk':
+                name = model._meta.pk.name
+
+            field = fields.get(name)
+            if field is None:
+                return None
+
+            if name in related:
+                sub = related[name]
+                if not hasattr(sub, 'get'):
+                    return None
+
+                if is_join(field) and field.concrete:
+                    plan = self.compile(field.related_model, sub,
+                            prefix + name + '__', True)
+                    if plan is None:
+                        return None
+                    joins.append((key, prefix + field.attname, plan))
+                elif (field.many_to_many or field.one_to_many) and not nested:
+                    if not sub.get('values_list') or 'fields' not in sub:
+                        return None
+                    lists.append((key, field, tuple(sub['fields']),
+                            sub.get('flat', True)))
+                else:
+                    return None
+            elif field.concrete and not field.many_to_many:
+                columns.append((key, prefix + field.attname))
+            else:
+                return None
+
+        # Related templates without a field to show them under
+        if set(related) - set(template['fields']):
+            return None
+
+        return Plan(tuple(columns), tuple(joins), tuple(lists))
+
+    def get_columns(self, plan):
+        columns = []
+        for key, column in plan.columns:
+            columns.append(column)
+        for key, column, sub in plan.joins:
+            columns.append(column)
+            columns += self.get_columns(sub)
+        return columns
+
+    def prepare(self, queryset, template):
+        """Turns a queryset into one of the rows the template needs"""
+        plan = self.get_plan(queryset.model, template)
+        columns = [queryset.model._meta.pk.attname]
+        for column in self.get_columns(plan):
+            if column not in columns:
+                columns.append(column)
+        return queryset.values(*columns)
+
+    def get(self, queryset, template, **lookup):
+        return self.prepare(queryset, template).get(**lookup)
+
+    def build(self, row, plan):
+        data = {}
+        for key, column in plan.columns:
+            data[key] = row[column]
+        for key, column, sub in plan.joins:
+            data[key] = None if row[column] is None else self.build(row, sub)
+        return data
+
+    def read_lists(self, rows, model, plan):
+        """Reads the to-many values lists for all rows with a query each"""
+        pk = model._meta.pk.attname
+        pks = [row[pk] for row in rows]
+
+        values = {}
+        for key, field, fields, flat in plan.lists:
+            if field.concrete:
+                # A many to many field on this model
+                lookup = field.related_query_name()
+            else:
+                lookup = field.field.name
+
+            queryset = field.related_model._default_manager.filter(
+                    **{lookup + '__in': pks})
+
+            groups = values[key] = defaultdict(list)
+            for item in queryset.values_list(lookup, *fields):
+                if flat and len(fields) == 1:
+                    groups[item[0]].append(item[1])
+                else:
+                    groups[item[0]].append(item[1:])
+
+        return pk, values
+
+    def __call__(self, rows, template, model):
+        if isinstance(rows, dict):
+            return self([rows], template, model)[0]
+
+        rows = list(rows)
+        plan = self.get_plan(model, template)
+        data = [self.build(row, plan) for row in rows]
+
+        if plan.lists and rows:
+            pk, values = self.read_lists(rows, model, plan)
+            for row, item in zip(rows, data):
+                for key, groups in values.items():
+                    item[key] = groups.get(row[pk], [])
+
+        return data
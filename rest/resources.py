@@ -1,12 +1,16 @@
 import json
 import functools
 import copy
+import itertools
 from undjango import undjango
 
-from django.http import HttpRequest
-from django.db.models.query import QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.query import QuerySet, prefetch_related_objects
 from django.conf.urls import url
 from django.core.urlresolvers import reverse
+from django.utils import timezone
 
 """
 url = QuerySet = HttpRequest = reverse = NotImplemented
@@ -18,6 +22,14 @@ from . import validators
 from . import structures
 from . import slicers
 from . import templates
+from . import planners
+from . import readers
+from . import compressors
+from . import conditions
+from . import caches
+from . import admission
+from . import permissions
+from . import sideloads
 
 
 class Cardinality(structures.NestedClass):
@@ -37,29 +49,44 @@ class One(Cardinality):
         return resource.get_object()
 
     def PUT(self, resource):
-        return resource.update_object(create=True)
+        return resource.update_object(create=True), None
 
     def PATCH(self, resource):
-        return resource.update_object()
+        return resource.patch_object(), None
 
     def DELETE(self, resource):
-        resource.get_object().delete()
+        obj, meta = resource.get_object()
+        obj.delete()
+        return None, None
+
+
+class Some(Cardinality):
+    """Objects listed by their uids"""
+    methods = {'GET', 'DELETE'}
+
+    def GET(self, resource):
+        return resource.get_objects()
+
+    def DELETE(self, resource):
+        return None, resource.delete_objects()
 
 
 class Many(Cardinality):
-    methods = {'GET', 'POST', 'DELETE'}
+    methods = {'GET', 'POST', 'PATCH', 'DELETE'}
 
     def GET(self, resource):
         return resource.get_queryset()
 
     def POST(self, resource):
-        return resource.create_obj()
+        if isinstance(resource.data, list):
+            return resource.create_objects(), None
+        return resource.create_object(), None
+
+    def PATCH(self, resource):
+        return resource.update_objects(), None
 
     def DELETE(self, resource):
-        objects, meta = resource.get_queryset()
-        for obj in objects:
-            obj.delete()
-        return None, meta
+        return None, resource.delete_objects()
 
 
 class Resource(object, metaclass=structures.NestingMeta):
@@ -68,12 +95,47 @@ class Resource(object, metaclass=structures.NestingMeta):
 
     uid_field = 'pk'
 
+    # Columns validating conditional requests: a version number bumped on
+    # every change and/or the time of the last change
+    version_field = None
+    modified_field = None
+
+    # Write collection GETs to a streaming response, rendering rows in
+    # chunks of `chunk_size` so memory stays flat regardless of result size
+    stream = False
+    chunk_size = 100
+
+    # Rows inserted per statement by bulk POSTs
+    batch_size = 500
+
+    # Read GETs with values() in stead of model instances: True to opt in,
+    # False to opt out and None to do so whenever the template allows
+    read_values = None
+
     # Defines the actions performed on object collections
     Many = Many
 
     # Defines the actions performed on single objects
     One = One
 
+    # Defines the actions performed on objects listed by uid
+    Some = Some
+
+    # Relations clients may add with ?expand=, as a template or resource by
+    # field name. ?fields= narrows the template to the fields it shows.
+    expandable = {}
+    fields_name = 'fields'
+    expand_name = 'expand'
+
+    # Show objects of foreign keys once in an `included` section, which the
+    # client may choose with ?sideload=true or false
+    sideload = False
+    sideload_name = 'sideload'
+
+    # The query parameter listing uids, and the most uids one request lists
+    ids_name = 'ids'
+    max_ids = 100
+
     # Slice the queryset for collections
     Slicer = slicers.Slicer
 
@@ -100,9 +162,36 @@ class Resource(object, metaclass=structures.NestingMeta):
     # Turns the data object into a string
     Serializer = serializers.Serializer
 
+    # Compresses the response with an accepted content coding
+    Compressor = compressors.Compressor
+
+    # Answers conditional GETs from the version and modification fields
+    Condition = conditions.Condition
+
+    # Caches GET responses until a model they read changes
+    Cache = caches.Cache
+
+    # Caches the encoded rows of collections by their version
+    Fragments = caches.Fragments
+
+    # Limits the rows a request can see or change
+    Permission = permissions.Permission
+
+    # Renders related objects once per page in stead of in every row
+    Sideloader = sideloads.Sideloader
+
+    # Limits the requests handled at once
+    Admission = admission.Admission
+
     # The database columns to resource mapper
     Template = templates.Template
 
+    # Derives joins, prefetches and columns to load from the template
+    Planner = planners.Planner
+
+    # Builds rows straight from values() for templates of plain columns
+    Reader = readers.Reader
+
     option = structures.cache('Option')
     validate = structures.cache('Validator')
     filter = structures.cache('Filter')
@@ -111,6 +200,25 @@ class Resource(object, metaclass=structures.NestingMeta):
     dehydrate = structures.cache('Dehydrator')
     template = structures.cache('Template')
     serialize = structures.cache('Serializer')
+    plan = structures.cache('Planner')
+    read = structures.cache('Reader')
+    compress = structures.cache('Compressor')
+    condition = structures.cache('Condition')
+    cache = structures.cache('Cache')
+    fragments = structures.cache('Fragments')
+    admit = structures.cache('Admission')
+    permit = structures.cache('Permission')
+    sideloader = structures.cache('Sideloader')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        # Watch the models of cached resources from the start, so changes
+        # made before their first request move the cache too
+        model = cls.model if cls.queryset is None else cls.queryset.model
+        if model is not None and (cls.Cache.timeout or cls.Fragments.timeout):
+            cls.cache.watch(model, cls.template())
+            cls.fragments.watch(model, cls.template())
 
     def __init__(self, request=None, ids=None, data=None, query=None,
             method=None, template=None, **url_kwargs):
@@ -120,6 +228,12 @@ class Resource(object, metaclass=structures.NestingMeta):
         self.query = {}
         self.method = 'GET'
 
+        # Template options for this request, set by options
+        self.template_options = {}
+
+        # Rows rendered, which the throttle charges for pages not counted
+        self.rendered = 0
+
         if request: self.parse_request(request)
         if url_kwargs: self.parse_url(**url_kwargs)
 
@@ -128,8 +242,12 @@ class Resource(object, metaclass=structures.NestingMeta):
         if query: self.query = query
         if method: self.method = method
 
+        if template: self.template_options.update(template)
+
         self.request = request or HttpRequest()
-        #self.template = template or copy.deepcopy(self.template)
+
+        # Lets middleware see what the request asked for
+        self.request.resource = self
 
         if self.queryset is not None:
             self.queryset = self.queryset._clone()
@@ -142,74 +260,521 @@ class Resource(object, metaclass=structures.NestingMeta):
 
         # Apply options
         self.option(self, **self.query)
+        self.apply_fieldsets()
+        self.apply_sideloads()
 
     def act(self):
+        respond = functools.partial(self.cache, self, self.respond)
+        response = self.condition(self, respond)
+        return self.compress(self.request, response)
+
+    def get_actor(self):
         # Having a unique identifier determines whether to request
         # many objects or one
-        actor = self.One() if 'uid' in self.ids else self.Many()
+        if 'uid' in self.ids:
+            return self.One()
+        if self.get_uids() is not None:
+            return self.Some()
+        return self.Many()
 
-        errors = self.validate(**self.data)
+    def respond(self):
+        actor = self.get_actor()
+
+        errors = self.get_errors()
         if errors:
-            raise Exception()
+            raise exceptions.ValidationError(errors)
+
+        format = self.get_format()
+        serializer = self.get_serializer()
+
+        if (isinstance(actor, Many) and not self.sideloads and
+                self.fragments.applies(self, format)):
+            return self.fragments(self)
 
         data, meta = actor(self)
-        undjangoed = undjango.undjango(data, **self.template())
-        dehydrated = self.dehydrate(undjangoed)
+
+        if (self.stream and isinstance(actor, Many) and self.method == 'GET'
+                and not self.sideloads and serializer.can_stream(format)):
+            return serializer.stream(self.render_chunks(data), meta, format)
+
+        included = None
+        if self.sideloads and data is not None:
+            single = not isinstance(data, (list, QuerySet))
+            rows = [data] if single else list(data)
+            rendered = self.render(rows)
+            included = self.sideloader(self, rows, rendered)
+            if single:
+                rendered = rendered[0]
+            dehydrated = self.dehydrate(rendered)
+        else:
+            dehydrated = self.dehydrate(self.render(data))
 
         # TODO: make this configurable
-        if meta:
-            payload = {'data': dehydrated, 'meta': meta}
+        if meta or included is not None:
+            payload = {'data': dehydrated}
+            if meta:
+                payload['meta'] = meta
+            if included is not None:
+                payload['included'] = included
         else:
             payload = dehydrated
 
-        serialized = self.serialize(payload, format='json') #TODO
+        serialized = self.serialize(payload, format=format)
 
         return serialized
 
+    def get_errors(self):
+        """Validation errors of the body, by index for a list of rows"""
+        if not isinstance(self.data, list):
+            return self.validate(**self.data)
+
+        errors = {}
+        for index, row in enumerate(self.data):
+            if not isinstance(row, dict):
+                errors[index] = "Please send an object"
+                continue
+            messages = self.validate(**row)
+            if messages:
+                errors[index] = messages
+        return errors
+
+    def iter_chunks(self, data):
+        lookups = ()
+        if hasattr(data, 'iterator'):
+            # iterator() skips prefetch_related, so prefetch per chunk
+            lookups = data._prefetch_related_lookups
+            rows = data.prefetch_related(None).iterator()
+        else:
+            rows = iter(data)
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            if lookups:
+                prefetch_related_objects(chunk, *lookups)
+            yield chunk
+
+    def render_chunks(self, data):
+        for chunk in self.iter_chunks(data):
+            yield self.dehydrate(self.render(chunk))
+
+    def use_values(self):
+        if self.read_values is False or self.method != 'GET':
+            return False
+        return self.read.supports(self.model, self.get_template())
+
+    def render(self, data):
+        template = self.get_template()
+        if self.use_values():
+            rendered = self.read(data, template, self.model)
+        else:
+            rendered = undjango.undjango(data, **template)
+        if isinstance(rendered, list):
+            self.rendered += len(rendered)
+        return rendered
+
+    def get_serializer(self):
+        return structures.instance(type(self), 'Serializer')
+
+    def get_format(self):
+        """Negotiates the response format from ?format= or Accept"""
+        return self.Serializer.negotiate(self.query.get('format', None),
+                self.request.META.get('HTTP_ACCEPT'))
+
+    def get_template(self):
+        return self.template(**self.template_options)
+
+    def get_list_param(self, name):
+        value = self.query.get(name) or ''
+        return [item.strip() for item in value.split(',') if item.strip()]
+
+    def apply_fieldsets(self):
+        """Narrows the template to ?fields= and adds the ?expand= relations"""
+        fields = self.get_list_param(self.fields_name)
+        expand = self.get_list_param(self.expand_name)
+        if not fields and not expand:
+            return
+
+        template = self.get_template()
+        try:
+            if expand:
+                template = templates.expand(template, expand, self.expandable)
+            if fields:
+                # Expanded relations are shown without naming them again
+                fields += [name for name in expand if name not in
+                        templates.split_paths(fields)]
+                template = templates.select(template, fields, self.model)
+        except ValueError as error:
+            raise exceptions.BadRequest("Please ask for fields this "
+                    "resource shows, {} is not one of them".format(error))
+
+        self.template_options.update({key: template[key]
+                for key in ('fields', 'related') if key in template})
+
+    def use_sideloads(self):
+        flag = self.query.get(self.sideload_name)
+        if flag is None:
+            return self.sideload
+        return flag == 'true'
+
+    def apply_sideloads(self):
+        """Takes the relations to sideload out of the template"""
+        self.sideloads = ()
+        if not self.use_sideloads():
+            return
+
+        template = self.get_template()
+        relations = self.sideloader.get_relations(self.model, template)
+        if relations:
+            self.template_options.update(self.sideloader.get_options(
+                    self.model, template, relations))
+            self.sideloads = tuple(relations)
+
     def get_ids(self):
         ids = {}
         if 'uid' in self.ids:
             ids[self.get_uid_field()] = self.ids['uid']
         return ids
 
+    def get_uids(self):
+        """The uids of a comma separated uid segment or ?ids=, in order"""
+        if 'uids' in self.ids:
+            value = self.ids['uids']
+        elif self.ids_name in self.query:
+            value = self.query[self.ids_name]
+        else:
+            return None
+
+        uids = []
+        for uid in value.split(','):
+            uid = uid.strip()
+            if uid and uid not in uids:
+                uids.append(uid)
+        if len(uids) > self.max_ids:
+            raise exceptions.BadRequest("Please list at most {} ids"
+                    .format(self.max_ids))
+        return uids
+
     def get_data(self):
         data = copy.deepcopy(self.data)
         data.update(self.get_ids())
         data = self.hydrate(data)
         return data
 
-    def get_queryset(self):
+    def get_rows_data(self):
+        """Hydrates a list of rows, all at once"""
+        rows = copy.deepcopy(self.data)
+        ids = self.get_ids()
+        for row in rows:
+            row.update(ids)
+        return self.hydrate(rows)
+
+    def get_permitted(self):
+        """The rows of the queryset this request may see or change"""
+        return self.permit(self, self.queryset)
+
+    def get_collection(self):
         # Filter on super resource ids
-        original = self.queryset.filter(**self.get_ids())
+        original = self.get_permitted().filter(**self.get_ids())
+
+        # Filter on listed uids
+        uids = self.get_uids()
+        if uids is not None:
+            original = original.filter(**{self.get_uid_field() + '__in': uids})
 
         # Apply conditional filters
-        filtered = self.filter(original, **self.query)
+        return self.filter(original, **self.query)
+
+    def prepare(self, queryset):
+        """Loads what the template reads from the queryset"""
+        if self.use_values():
+            # Select just the columns the template shows
+            rows = self.read.prepare(queryset, self.get_template())
+            # The keys of sideloaded objects and what the slicer orders on
+            extra = [field.attname for key, field, sub in self.sideloads]
+            extra += self.slice.get_columns(self)
+            missing = tuple(column for column in dict.fromkeys(extra)
+                    if column not in rows._fields)
+            if missing:
+                rows = rows.values(*(rows._fields + missing))
+            return rows
+        # Load what the template touches in a fixed number of queries
+        return self.plan(queryset, self.get_template(),
+                [field.name for key, field, sub in self.sideloads])
+
+    def get_queryset(self):
+        planned = self.prepare(self.get_collection())
 
         # Paginate the result set
-        sliced, meta = self.slice(self, filtered)
+        sliced, meta = self.slice(self, planned)
 
         return sliced, meta
 
+    def get_objects(self):
+        """The objects of the listed uids in their order, and the missing"""
+        uids = self.get_uids()
+        field = self.model._meta.get_field(self.get_uid_field())
+        rows = self.prepare(self.get_collection())
+
+        if getattr(rows, '_fields', None) and field.attname not in rows._fields:
+            # values() rows need the uid to be put in order
+            rows = rows.values(*(rows._fields + (field.attname,)))
+
+        found = {}
+        for row in rows:
+            if isinstance(row, dict):
+                found[str(row[field.attname])] = row
+            else:
+                found[str(getattr(row, field.attname))] = row
+
+        objects = [found[uid] for uid in uids if uid in found]
+        missing = [uid for uid in uids if uid not in found]
+        return objects, {'missing': missing}
+
     def get_object(self):
         data = self.get_data()
-        return self.queryset.get(**data), None
+        try:
+            return self.prepare(self.get_permitted()).get(**data), None
+        except self.model.DoesNotExist:
+            raise exceptions.NotFound()
+
+    def match_tags(self, queryset, tags):
+        """Narrows a queryset to the row if it has one of the If-Match tags"""
+        if '*' in tags:
+            return queryset
+
+        if self.version_field:
+            try:
+                return queryset.filter(**{self.version_field + '__in': tags})
+            except (ValueError, TypeError):
+                raise exceptions.PreconditionFailed()
+
+        if self.modified_field:
+            tag, modified = self.condition.get_one(self)
+            if tag in tags:
+                return queryset.filter(**{self.modified_field: modified})
+
+        raise exceptions.PreconditionFailed()
 
     def update_object(self, create=False):
+        """
+        Replaces the object with the data sent, creating it if `create`.
+        An existing row is written with a single UPDATE, bumping the
+        version, and only if it still has a tag If-Match names.
+        """
         data = self.get_data()
+        ids = self.get_ids()
+
+        permitted = self.get_permitted().filter(**ids)
+        exists = permitted.exists()
+        if not exists and (not create or self.queryset.filter(**ids).exists()):
+            raise exceptions.NotFound()
+
+        tags = self.condition.get_if_match(self.request)
         obj = self.model(**data)
-        if create:
-            obj.save(update_fields=data.keys())
+
+        if not exists:
+            if tags is not None:
+                raise exceptions.PreconditionFailed()
+            self.check_writable()
+            with transaction.atomic():
+                obj.save()
+                self.check_created([obj])
+            return obj
+
+        queryset = permitted
+        if tags is not None:
+            queryset = self.match_tags(queryset, tags)
+
+        # The columns save() would write
+        fields = {field.attname: field.pre_save(obj, False)
+                for field in self.model._meta.local_concrete_fields
+                if not field.primary_key}
+        fields.update(self.get_bumps())
+
+        if not queryset.update(**fields):
+            if tags is not None and permitted.exists():
+                raise exceptions.PreconditionFailed()
+            raise exceptions.NotFound()
+
+        self.changed()
+        return self.prepare(self.queryset).get(**ids)
+
+    def get_bumps(self):
+        """The new version and modification time of a row being updated"""
+        bumps = {}
+        if self.version_field:
+            bumps[self.version_field] = F(self.version_field) + 1
+        if self.modified_field:
+            bumps[self.modified_field] = timezone.now()
+        return bumps
+
+    def patch_object(self):
+        """
+        Updates just the columns sent with a single UPDATE, bumping the
+        version and modification time, and only if the row still has a tag
+        If-Match names
+        """
+        data = self.get_data()
+        ids = self.get_ids()
+        fields = {key: val for key, val in data.items() if key not in ids}
+
+        queryset = self.get_permitted().filter(**ids)
+        tags = self.condition.get_if_match(self.request)
+        if tags is not None:
+            queryset = self.match_tags(queryset, tags)
+
+        fields.update(self.get_bumps())
+        if fields:
+            updated = queryset.update(**fields)
         else:
-            obj.save()
-        return obj
+            updated = queryset.exists()
+
+        if not updated:
+            if tags is not None and self.get_permitted().filter(**ids).exists():
+                raise exceptions.PreconditionFailed()
+            raise exceptions.NotFound()
+
+        if fields:
+            self.changed()
+        return self.prepare(self.queryset).get(**ids)
 
     def create_object(self):
+        self.check_writable()
         data = self.get_data()
-        data.pop(self.get_uid_field())
+        data.pop(self.get_uid_field(), None)
         obj = self.model(**data)
-        obj.save()
+        with transaction.atomic():
+            obj.save()
+            self.check_created([obj])
         return obj
 
+    def check_writable(self):
+        if self.permit.get_q(self) is False:
+            raise exceptions.Forbidden()
+
+    def check_created(self, objs):
+        """Rolls back rows just created that the rule doesn't allow"""
+        q = self.permit.get_q(self)
+        if q is None or q is True:
+            return
+        pks = {obj.pk for obj in objs}
+        allowed = self.get_permitted().filter(pk__in=pks).count()
+        if allowed != len(pks):
+            raise exceptions.Forbidden()
+
+    def returns_bulk_keys(self):
+        """Whether bulk_create sets the primary keys of the rows"""
+        features = connections[self.queryset.db].features
+        return (getattr(features, 'can_return_rows_from_bulk_insert', False) or
+                getattr(features, 'can_return_ids_from_bulk_insert', False))
+
+    def create_objects(self):
+        """Inserts a list of rows with chunked bulk_create"""
+        self.check_writable()
+        uid = self.get_uid_field()
+        objs = []
+        for row in self.get_rows_data():
+            if uid == self.model._meta.pk.name:
+                row.pop(uid, None)
+            objs.append(self.model(**row))
+
+        q = self.permit.get_q(self)
+        with transaction.atomic():
+            if q is None or q is True or self.returns_bulk_keys():
+                created = self.model._default_manager.bulk_create(objs,
+                        batch_size=self.batch_size)
+            else:
+                # The rows are checked against the rule by their keys
+                for obj in objs:
+                    obj.save()
+                created = objs
+            self.check_created(created)
+            self.changed()
+        return created
+
+    def update_objects(self):
+        """
+        Updates a list of rows, found by their uid, in the columns each
+        one sends. Uses bulk_update where Django has it, and an UPDATE per
+        row without loading it elsewhere.
+        """
+        if not isinstance(self.data, list):
+            raise exceptions.BadRequest("Please send a list of objects")
+
+        uid = self.get_uid_field()
+        rows = self.get_rows_data()
+        errors = {index: {uid: "Please provide the {}".format(uid)}
+                for index, row in enumerate(rows) if uid not in row}
+        if errors:
+            raise exceptions.ValidationError(errors)
+
+        uids = [row[uid] for row in rows]
+        permitted = self.get_collection()
+
+        with transaction.atomic():
+            found = {str(value) for value in permitted
+                    .filter(**{uid + '__in': uids})
+                    .values_list(uid, flat=True)}
+            errors = {index: {uid: "Not found"}
+                    for index, row in enumerate(rows)
+                    if str(row[uid]) not in found}
+            if errors:
+                raise exceptions.ValidationError(errors)
+
+            # Rows are bumped like a PATCH of each would
+            bumps = self.get_bumps()
+
+            if (hasattr(permitted, 'bulk_update') and
+                    uid == self.model._meta.pk.name):
+                # Rows sending the same columns are updated together
+                groups = {}
+                for row in rows:
+                    fields = tuple(sorted(key for key in row
+                            if key != uid and key not in bumps))
+                    groups.setdefault(fields, []).append(
+                            self.model(**dict(row, **bumps)))
+                for fields, objs in groups.items():
+                    if fields:
+                        permitted.bulk_update(objs, fields + tuple(bumps),
+                                batch_size=self.batch_size)
+            else:
+                for row in rows:
+                    fields = {key: val for key, val in row.items()
+                            if key != uid}
+                    if fields:
+                        fields.update(bumps)
+                        permitted.filter(**{uid: row[uid]}).update(**fields)
+            self.changed()
+
+        return self.prepare(self.queryset.filter(**{uid + '__in': uids}))
+
+    def changed(self):
+        """
+        Moves the cache generation of the model once the transaction
+        commits, for writes that send no post_save or post_delete
+        """
+        transaction.on_commit(functools.partial(caches.bump, self.model))
+
+    def delete_objects(self):
+        """
+        Deletes the page of the collection, with one statement where Django
+        can delete it without loading the rows
+        """
+        collection = self.get_collection()
+        pks, meta = self.slice(self, collection.values_list('pk', flat=True))
+
+        if isinstance(pks, QuerySet) and pks.query.can_filter():
+            # The page is the whole collection
+            deleted = collection
+        else:
+            deleted = collection.filter(pk__in=list(pks))
+
+        with transaction.atomic():
+            deleted.delete()
+            self.changed()
+        return meta
+
     def location(self):
         #XXX This does not desubresource yet
         return reverse(self.get_full_name(), kwargs=self.ids)
@@ -218,9 +783,16 @@ class Resource(object, metaclass=structures.NestingMeta):
     def parse_method(self, method):
         self.method = method.upper()
 
-    def parse_body(self, body):
+    def parse_body(self, body, content_type=None):
         if body:
-            self.data.update(json.loads(body))
+            format = 'json'
+            if content_type:
+                format = self.Serializer.get_format(content_type)
+            data = self.get_serializer().parse(body, format)
+            if isinstance(data, list):
+                self.data = data
+            else:
+                self.data.update(data)
 
     def parse_query(self, **query):
         self.query.update(query)
@@ -230,7 +802,7 @@ class Resource(object, metaclass=structures.NestingMeta):
 
     def parse_request(self, request):
         self.parse_method(request.method)
-        self.parse_body(request.body)
+        self.parse_body(request.body, request.META.get('CONTENT_TYPE'))
         self.parse_query(**request.GET.dict())
 
     @classmethod
@@ -260,7 +832,14 @@ class Resource(object, metaclass=structures.NestingMeta):
 
     @classmethod
     def view(cls, request, **kwargs):
-        return cls(request, **kwargs).act()
+        try:
+            resource = cls(request, **kwargs)
+            return resource.admit(resource, resource.act)
+        except exceptions.HttpError as error:
+            response = HttpResponse(str(error), status=error.status)
+            for header, value in error.headers.items():
+                response[header] = value
+            return response
 
     @classmethod
     def urls(cls):
@@ -268,6 +847,7 @@ class Resource(object, metaclass=structures.NestingMeta):
         base = cls.get_name()
         return (
             url(base + '$', cls.view, name=name),
+            url(base + '/(?P<uids>[^/]*,[^/]*)$', cls.view, name=name),
             url(base + '/(?P<uid>[^/]+)$', cls.view, name=name)
         )
 
@@ -313,6 +893,7 @@ class Subresource(Resource):
         base = '{}/(?P<rel>[^/]+)/{}'.format(cls.get_rel_name(), cls.get_name())
         return (
             url(base + '$', cls.view, name=name),
+            url(base + '/(?P<uids>[^/]*,[^/]*)$', cls.view, name=name),
             url(base + '/(?P<uid>[^/]+)$', cls.view, name=name),
         )
 
@@ -1,15 +1,261 @@
 import json
+import uuid
+import decimal
+import datetime
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import Promise
+
+from . import exceptions
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def parse_accept(header):
+    """Yields (media type, quality) pairs from an Accept header"""
+    for media_range in header.split(','):
+        media_type, *params = media_range.split(';')
+        quality = 1.0
+        for param in params:
+            key, _, val = param.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(val)
+                except ValueError:
+                    quality = 0.0
+        media_type = media_type.strip().lower()
+        if media_type:
+            yield media_type, quality
 
-from django.http import HttpResponse
 
 class Serializer:
+    # Encoders for values JSON has no type for, by type. Values are looked
+    # up by their exact type first and along their MRO after.
+    encoders = {
+        datetime.datetime: datetime.datetime.isoformat,
+        datetime.date: datetime.date.isoformat,
+        datetime.time: datetime.time.isoformat,
+        datetime.timedelta: datetime.timedelta.total_seconds,
+        decimal.Decimal: str,
+        uuid.UUID: str,
+        set: list,
+        frozenset: list,
+        Promise: str,
+    }
+
+    # Use orjson when it is installed, unless `encoders` differ from how
+    # it encodes the types it knows. It hands datetimes to `default`.
+    fast = True
+
+    # Types orjson encodes by itself, with the encoder doing the same
+    native = {
+        uuid.UUID: str,
+    }
+
+    # Formats by name and media type, in order of preference. Formats
+    # whose library is not installed are not offered.
+    formats = (
+        ('json', 'application/json'),
+        ('msgpack', 'application/msgpack'),
+        ('cbor', 'application/cbor'),
+    )
+
+    # Other media types clients use for the formats
+    aliases = {
+        'application/x-msgpack': 'msgpack',
+    }
+
+    def __init__(self):
+        self.resolved = {}
+        self.encoder = json.JSONEncoder(default=self.default,
+                ensure_ascii=False, separators=(',', ':'))
+        self.like_native = self.encodes_like_native()
+
+    def encodes_like_native(self):
+        for type, encoder in self.encoders.items():
+            for native, same in self.native.items():
+                if issubclass(type, native) and encoder is not same:
+                    return False
+        return True
+
+    @classmethod
+    def register(cls, type):
+        """Registers a function encoding values of `type` for this class"""
+        def decorator(encoder):
+            if 'encoders' not in cls.__dict__:
+                cls.encoders = dict(cls.encoders)
+            cls.encoders[type] = encoder
+            return encoder
+        return decorator
+
+    def default(self, value):
+        cls = type(value)
+        try:
+            encoder = self.resolved[cls]
+        except KeyError:
+            encoder = None
+            for base in cls.__mro__:
+                if base in self.encoders:
+                    encoder = self.encoders[base]
+                    break
+            self.resolved[cls] = encoder
+
+        if encoder is None:
+            raise TypeError("{!r} is not JSON serializable".format(value))
+        return encoder(value)
+
+    @classmethod
+    def available(cls):
+        for format, media_type in cls.formats:
+            if format == 'msgpack' and msgpack is None:
+                continue
+            if format == 'cbor' and cbor2 is None:
+                continue
+            yield format, media_type
+
+    @classmethod
+    def get_media_type(cls, format):
+        return dict(cls.formats)[format]
+
+    @classmethod
+    def negotiate(cls, format=None, accept=None):
+        """
+        Picks a format by name, or else by the Accept header, preferring
+        the client's highest quality and then the order of `formats`
+        """
+        available = list(cls.available())
+
+        if format is not None:
+            if format not in dict(available):
+                raise exceptions.NotAcceptable("Please request one of {}"
+                        .format(', '.join(name for name, _ in available)))
+            return format
+
+        if not accept:
+            return available[0][0]
+
+        best, best_quality = None, 0
+        for media_type, quality in parse_accept(accept):
+            if quality <= best_quality:
+                continue
+            for name, offered in available:
+                if (media_type in ('*/*', offered) or
+                        cls.aliases.get(media_type) == name or
+                        media_type == offered.split('/')[0] + '/*'):
+                    best, best_quality = name, quality
+                    break
+
+        if best is None:
+            raise exceptions.NotAcceptable("Please accept one of {}"
+                    .format(', '.join(offered for _, offered in available)))
+        return best
+
+    @classmethod
+    def get_format(cls, content_type):
+        """The format of a request body by its Content-Type"""
+        media_type = content_type.split(';')[0].strip().lower()
+        for name, offered in cls.available():
+            if media_type == offered or cls.aliases.get(media_type) == name:
+                return name
+        raise exceptions.UnsupportedMediaType("Please send one of {}"
+                .format(', '.join(offered for _, offered in cls.available())))
+
     def json(self, data):
-        return json.dumps(data)
+        if self.fast and orjson is not None and self.like_native:
+            try:
+                return orjson.dumps(data, default=self.default,
+                        option=orjson.OPT_NON_STR_KEYS |
+                        orjson.OPT_PASSTHROUGH_DATETIME)
+            except orjson.JSONEncodeError:
+                # Like integers over 64 bits, which json encodes
+                pass
+        return self.encoder.encode(data).encode('utf-8')
+
+    def msgpack(self, data):
+        return msgpack.packb(data, default=self.default, use_bin_type=True)
+
+    def cbor(self, data):
+        return cbor2.dumps(data, timezone=datetime.timezone.utc,
+                default=lambda encoder, value: encoder.encode(self.default(value)))
+
+    def parse_json(self, body):
+        return json.loads(str(body, 'utf-8') if isinstance(body, bytes) else body)
+
+    def parse_msgpack(self, body):
+        return msgpack.unpackb(body, raw=False)
+
+    def parse_cbor(self, body):
+        return cbor2.loads(body)
+
+    def parse(self, body, format='json'):
+        try:
+            return getattr(self, 'parse_' + format)(body)
+        except exceptions.HttpError:
+            raise
+        except Exception:
+            raise exceptions.BadRequest("Please send a valid {} body"
+                    .format(format))
+
+    def json_envelope(self, fragments, meta):
+        """
+        Yields the document `json` would produce for
+        `{'data': rows, 'meta': meta}` around rows that are encoded already,
+        given as pieces of one or more comma separated rows.
+        """
+        yield b'{"data":[' if meta else b'['
+        separator = b''
+        for fragment in fragments:
+            if fragment:
+                yield separator + fragment
+                separator = b','
+        yield b'],"meta":' + self.json(meta) + b'}' if meta else b']'
+
+    def json_stream(self, chunks, meta):
+        """
+        Yields the same document `json` would produce for
+        `{'data': rows, 'meta': meta}`, one chunk of rows at a time.
+        """
+        return self.json_envelope((b','.join(self.json(row) for row in chunk)
+                for chunk in chunks), meta)
+
+    def can_stream(self, format):
+        return hasattr(self, format + '_stream')
+
+    def stream(self, chunks, meta, format):
+        serializer = getattr(self, format + '_stream')
+        response = StreamingHttpResponse(serializer(chunks, meta),
+                content_type=self.get_media_type(format))
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+    def splice(self, fragments, meta):
+        """A JSON response of rows that are encoded already"""
+        response = HttpResponse(b''.join(self.json_envelope(fragments, meta)),
+                content_type=self.get_media_type('json'))
+        patch_vary_headers(response, ('Accept',))
+        return response
 
     def __call__(self, data, format):
         serializer = getattr(self, format)
         if serializer:
             content = serializer(data)
         else:
-            content = ''
-        return HttpResponse(content)
+            content = b''
+        response = HttpResponse(content,
+                content_type=self.get_media_type(format))
+        patch_vary_headers(response, ('Accept',))
+        return response
@@ -0,0 +1,77 @@
+from undjango import undjango
+
+from .structures import NestedClass
+from .planners import get_field, is_join
+from .templates import freeze, get_shown
+
+
+class Sideloader(NestedClass):
+    """
+    Renders the objects a page points at through foreign keys once, in an
+    `included` section by relation and primary key, in stead of nesting a
+    copy of them in every row. Rows show the key in their place.
+
+    Related templates of forward foreign keys and one to one fields are
+    sideloaded, other relations stay nested.
+    """
+    def get_relations(self, model, template):
+        """The (key, field, template) of the relations to sideload"""
+        aliases = template.get('aliases', {})
+        related = template.get('related', {})
+
+        relations = []
+        for key in get_shown(template, model):
+            name = aliases.get(key, key)
+            sub = related.get(name)
+            if sub is None or not hasattr(sub, 'get'):
+                continue
+            field = get_field(model, name)
+            if field is not None and field.concrete and is_join(field):
+                relations.append((key, field, sub))
+        return relations
+
+    def get_options(self, model, template, relations):
+        """Template options for rows without the sideloaded relations"""
+        keys = [key for key, field, sub in relations]
+        names = [field.name for key, field, sub in relations]
+        return {
+            'fields': freeze([key for key in get_shown(template, model)
+                    if key not in keys]),
+            'related': freeze({name: sub for name, sub
+                    in template.get('related', {}).items()
+                    if name not in names}),
+        }
+
+    def get_key(self, row, field):
+        if isinstance(row, dict):
+            return row[field.attname]
+        return getattr(row, field.attname)
+
+    def load(self, resource, field, template, keys):
+        """Renders the objects of a relation by their key"""
+        model = field.related_model
+        target = field.target_field
+        queryset = model._default_manager.filter(**{target.name + '__in': keys})
+
+        if resource.read.supports(model, template):
+            rows = list(resource.read.prepare(queryset, template))
+            rendered = resource.read(rows, template, model)
+        else:
+            rows = list(resource.plan(queryset, template))
+            rendered = undjango.undjango(rows, **template)
+
+        return {str(self.get_key(row, target)): item
+                for row, item in zip(rows, rendered)}
+
+    def __call__(self, resource, rows, rendered):
+        """Puts keys in the rendered rows and returns the included objects"""
+        included = {}
+        for key, field, template in resource.sideloads:
+            keys = []
+            for row, item in zip(rows, rendered):
+                value = self.get_key(row, field)
+                item[key] = value
+                if value is not None and value not in keys:
+                    keys.append(value)
+            included[key] = self.load(resource, field, template, keys) if keys else {}
+        return included
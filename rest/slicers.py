@@ -1,5 +1,9 @@
 import www
 
+from django.core import signing
+
+from . import exceptions
+from .counters import counters
 from .structures import NestedClass
 
 DEFAULT_LIMIT = 10
@@ -15,6 +19,16 @@ class Slicer(NestedClass):
     limit_name = 'limit'
     offset_name = 'offset'
     count_name = 'count'
+    count_type_name = 'count_type'
+
+    # The count strategy, one of `counters`, which the client may override
+    # with the `counter_name` query parameter
+    counter = 'exact'
+    counter_name = 'count'
+    counters = counters
+
+    # Seconds a cached count is reused
+    count_timeout = 60
 
     next_name = 'next'
     prev_name = 'prev'
@@ -27,11 +41,11 @@ class Slicer(NestedClass):
             try:
                 limit = int(limit)
             except ValueError:
-                raise Exception("Please provide a valid integer value")
+                raise exceptions.BadRequest("Please provide a valid integer value")
             if limit < 0:
-                raise Exception("Please provide a valid positive integer value")
+                raise exceptions.BadRequest("Please provide a valid positive integer value")
         if self.max_limit is not None:
-            limit = min(max(limit, 0), max_limit)
+            limit = self.max_limit if limit is None else min(limit, self.max_limit)
         return limit
 
     def get_offset(self, resource):
@@ -42,13 +56,25 @@ class Slicer(NestedClass):
             try:
                 offset = int(offset)
             except ValueError:
-                raise Exception("Please provide a valid integer value")
+                raise exceptions.BadRequest("Please provide a valid integer value")
             if offset < 0:
-                raise Exception("Please provide a valid positive integer value")
+                raise exceptions.BadRequest("Please provide a valid positive integer value")
         if self.max_offset is not None:
-            offset = min(max(offset, 0), max_offset)
+            offset = min(offset, self.max_offset)
         return offset
 
+    def get_counter(self, resource):
+        name = resource.query.get(self.counter_name, self.counter)
+        try:
+            return self.counters[name]
+        except KeyError:
+            raise exceptions.BadRequest("Please provide one of {}"
+                    .format(', '.join(sorted(self.counters))))
+
+    def get_columns(self, resource):
+        """Columns the slicer reads from rows besides those shown"""
+        return ()
+
     def get_count(self, collection):
         try:
             return collection.count()
@@ -65,11 +91,20 @@ class Slicer(NestedClass):
             return None
         return self.get_uri(resource, limit, offset - limit)
 
-    def get_next(self, resource, limit, offset, count):
-        if limit is None or offset + limit >= count:
+    def get_next(self, resource, limit, offset, more):
+        if limit is None or not more:
             return None
         return self.get_uri(resource, limit, offset + limit)
 
+    def get_rows(self, slice, count, limit, offset):
+        """The number of rows of a page, None when it wasn't counted"""
+        if isinstance(slice, list):
+            return len(slice)
+        if count is not None:
+            rows = count - offset
+            return max(rows if limit is None else min(rows, limit), 0)
+        return limit
+
     def get_slice(self, collection, limit=None, offset=None):
         offset = offset or 0
         if limit is None:
@@ -80,13 +115,18 @@ class Slicer(NestedClass):
     def __call__(self, resource, collection):
         limit = self.validate_limit(self.get_limit(resource))
         offset = self.validate_offset(self.get_offset(resource))
-        count = self.get_count(collection)
+        counter = self.get_counter(resource)
 
-        slice = self.get_slice(collection, limit, offset)
+        slice, count, kind, more = counter(self, collection, limit, offset)
 
-        meta = {
-            self.count_name: count,
-        }
+        # What the page holds, which the throttle charges for
+        resource.rows = self.get_rows(slice, count, limit, offset)
+
+        meta = {}
+
+        if count is not None:
+            meta[self.count_name] = count
+            meta[self.count_type_name] = kind
 
         if offset:
             meta[self.offset_name] = offset
@@ -98,13 +138,131 @@ class Slicer(NestedClass):
         if prev:
             meta[self.prev_name] = prev
 
-        next = self.get_next(resource, limit, offset, count)
+        next = self.get_next(resource, limit, offset, more)
         if next:
             meta[self.next_name] = next
 
         return slice, meta
 
 
+class CursorSlicer(Slicer):
+    """
+    A keyset slicer
+
+    Pages by filtering on an indexed, unique ordering `key` in stead of
+    skipping `offset` rows, so every page costs the same. The `next` and
+    `prev` links carry signed cursor tokens holding the key value of the
+    last and first row of the page.
+    """
+    # The ordering key, the resource's uid field by default. Prefix with
+    # '-' to page in descending order.
+    key = None
+
+    counter = 'none'
+
+    before_name = 'before'
+    after_name = 'after'
+
+    salt = 'rest.slicers.CursorSlicer'
+
+    def get_key(self, resource):
+        return self.key or resource.get_uid_field()
+
+    def get_columns(self, resource):
+        return self.get_key(resource).lstrip('-'),
+
+    def get_value(self, row, field):
+        if isinstance(row, dict):
+            value = row[field]
+        else:
+            value = getattr(row, field)
+        if not isinstance(value, (int, float, str)):
+            value = str(value)
+        return value
+
+    def dump_cursor(self, value):
+        return signing.dumps(value, salt=self.salt)
+
+    def load_cursor(self, token):
+        try:
+            return signing.loads(token, salt=self.salt)
+        except signing.BadSignature:
+            raise exceptions.BadRequest("Please provide a valid cursor")
+
+    def get_cursor(self, resource, name):
+        token = resource.query.get(name, None)
+        if token is None:
+            return None
+        return self.load_cursor(token)
+
+    def get_uri(self, resource, limit, name, value):
+        query = {self.limit_name: limit, name: self.dump_cursor(value)}
+        return www.URL(resource.location(), **query)
+
+    def get_page(self, collection, key, limit, after=None, before=None):
+        field = key.lstrip('-')
+        descending = key.startswith('-')
+
+        if before is not None:
+            lookup = 'gt' if descending else 'lt'
+            key = field if descending else '-' + field
+            collection = collection.filter(**{field + '__' + lookup: before})
+        elif after is not None:
+            lookup = 'lt' if descending else 'gt'
+            collection = collection.filter(**{field + '__' + lookup: after})
+
+        # Fetch one extra row to find out if there is another page
+        rows = list(collection.order_by(key)[:limit + 1])
+        more = len(rows) > limit
+        rows = rows[:limit]
+
+        if before is not None:
+            rows.reverse()
+
+        return rows, more
+
+    def __call__(self, resource, collection):
+        limit = self.validate_limit(self.get_limit(resource))
+        if limit is None:
+            limit = self.limit
+
+        key = self.get_key(resource)
+        field = key.lstrip('-')
+        after = self.get_cursor(resource, self.after_name)
+        before = self.get_cursor(resource, self.before_name)
+
+        count, kind = self.get_counter(resource).count(self, collection)
+        rows, more = self.get_page(collection, key, limit, after, before)
+        resource.rows = len(rows)
+
+        meta = {
+            self.limit_name: limit,
+        }
+
+        if count is not None:
+            meta[self.count_name] = count
+            meta[self.count_type_name] = kind
+
+        if rows:
+            first = self.get_value(rows[0], field)
+            last = self.get_value(rows[-1], field)
+
+            if before is not None:
+                has_prev, has_next = more, True
+            else:
+                has_prev, has_next = after is not None, more
+
+            if has_prev:
+                meta[self.prev_name] = self.get_uri(resource, limit,
+                        self.before_name, first)
+
+            if has_next:
+                meta[self.next_name] = self.get_uri(resource, limit,
+                        self.after_name, last)
+
+        return rows, meta
+
+
 class Paginator:
     offset_name = 'page'
     limit_name = 'size'
@@ -120,14 +120,95 @@ class NestingMeta(type):
             attrs[key] = type(key, val, {})
             attrs['_nested_classes'].append(key)
 
+        # Resolve the dispatch tables of the final nested classes up front
+        for key in attrs['_nested_classes']:
+            if hasattr(attrs[key], '_compile'):
+                attrs[key]._compile()
+
         return super().__new__(meta, name, bases, attrs)
 
 
 class NestedApi(NestedClass):
+    """
+    Dispatches to its public methods by name. The methods are resolved once
+    per class into a dispatch table, ordered by definition with those of
+    base classes first.
+    """
+    # Method names that are never dispatched to
+    _reserved = ('before', 'after')
+
+    @classmethod
+    def _compile(cls):
+        names = {}
+        for klass in reversed(cls.__mro__):
+            for name, val in vars(klass).items():
+                if (inspect.isfunction(val) and not name.startswith('_')
+                        and name not in cls._reserved):
+                    names[name] = None
+
+        table = []
+        for name in names:
+            # The most derived attribute, which may disable the method
+            method = getattr(cls, name)
+            if inspect.isfunction(method):
+                table.append((name, method))
+
+        cls._dispatch = tuple(table)
+        return cls._dispatch
+
+    @classmethod
+    def _table(cls):
+        try:
+            return cls.__dict__['_dispatch']
+        except KeyError:
+            return cls._compile()
+
     def _methods(self):
-        for name, method in inspect.getmembers(self, predicate=inspect.ismethod):
-            if not name.startswith('_') and not name in ('before', 'after'):
-                yield name, method
+        for name, method in self._table():
+            yield name, method.__get__(self)
+
+def batch(method):
+    """
+    Marks an Updater method as taking the list of all rows and returning a
+    list of values for its key, one per row, so it runs once per page.
+
+        @batch
+        def owner_name(self, rows):
+            names = dict(Person.objects.filter(
+                pk__in=[row['owner'] for row in rows]).values_list('pk', 'name'))
+            return [names.get(row['owner']) for row in rows]
+    """
+    method.batch = 'rows'
+    return method
+
+
+def column(method):
+    """
+    Marks an Updater method as taking the values of its key for all rows
+    and returning the new values.
+
+        @column
+        def timestamp(self, values):
+            return [str(value) for value in values]
+    """
+    method.batch = 'column'
+    return method
+
+
+def cost(points):
+    """
+    Sets the throttle cost of a Filter method, for filters that are harder
+    on the database than others.
+
+        @cost(5)
+        def search(self, queryset, text):
+            return queryset.filter(text__icontains=text)
+    """
+    def decorator(method):
+        method.cost = points
+        return method
+    return decorator
+
 
 class Updater(NestedApi):
     """
@@ -137,6 +218,9 @@ class Updater(NestedApi):
         def signature(self, data):
             return data['something'] * 100
 
+    A list of dictionaries is updated one method at a time, which lets
+    methods marked with `batch` or `column` handle all rows in one call.
+
     All keys in the `omits` tuple are removed from the dictionary
     """
 
@@ -144,14 +228,40 @@ class Updater(NestedApi):
 
     def __call__(self, data=None):
         if isinstance(data, list):
-            return [self(d) for d in data]
+            return self._update(data)
 
         if hasattr(self, 'before'):
             data = self.before(data)
 
-        for name, method in self._methods():
-            data[name] = method(data)
+        for name, method in self._table():
+            if hasattr(method, 'batch'):
+                data[name] = self._apply(name, method, [data])[0]
+            else:
+                data[name] = method(self, data)
+
+        return self._finish(data)
+
+    def _apply(self, name, method, rows):
+        if method.batch == 'column':
+            return list(method(self, [row.get(name) for row in rows]))
+        return list(method(self, rows))
+
+    def _update(self, rows):
+        if hasattr(self, 'before'):
+            rows = [self.before(row) for row in rows]
 
+        for name, method in self._table():
+            if hasattr(method, 'batch'):
+                values = self._apply(name, method, rows)
+            else:
+                values = [method(self, row) for row in rows]
+
+            for row, value in zip(rows, values):
+                row[name] = value
+
+        return [self._finish(row) for row in rows]
+
+    def _finish(self, data):
         if hasattr(self, 'after'):
             data = self.after(data)
 
@@ -162,12 +272,10 @@ class Updater(NestedApi):
         return data
 
 
-class Reducer(NestedClass):
+class Reducer(NestedApi):
     """
-    Heads up! Unspecified evaluation order, therefore operations must
-    be commutative.
-
-    Reduce on the queryset
+    Reduce on the queryset with the methods matching the query keys, in
+    the order they are defined.
 
     def signature(self, queryset, val):
         return queryset.filter(value__gt=val)
@@ -176,10 +284,9 @@ class Reducer(NestedClass):
         if hasattr(self, 'before'):
             queryset = self.before(queryset, **query)
 
-        for key, val in query.items():
-            method = getattr(self, key, None)
-            if method:
-                queryset = method(queryset, val)
+        for name, method in self._table():
+            if name in query:
+                queryset = method(self, queryset, query[name])
 
         if hasattr(self, 'after'):
             queryset = self.after(queryset, **query)
@@ -187,38 +294,78 @@ class Reducer(NestedClass):
         return queryset
 
 
-class Mapper(NestedClass):
+class Mapper(NestedApi):
     """
     This class acts as a namespace for static functions which get called with
-    arguments passed in a dictionary. With the following signature:
+    arguments passed in a dictionary, in the order they are defined. With the
+    following signature:
 
     def signature(self, resource, val):
         resource.value = val
-
-
-    Heads up! Unspecified evaluation order, therefore operations must
-    be commutative.
     """
     def __call__(self, resource, **options):
         if hasattr(self, 'before'):
             self.before(resource, **options)
 
-        for key, val in options.items():
-            method = getattr(self, key, None)
-            if method:
-                method(resource, val)
+        for name, method in self._table():
+            if name in options:
+                method(self, resource, options[name])
 
         if hasattr(self, 'after'):
             self.after(resource, **options)
 
-def cache(name):
+def instance(cls, name):
+    """Returns the instance of the nested class `name` kept on `cls`"""
     attr = '_' + name.lower()
-    @classmethod
-    def call(cls, *a, **kw):
-        if not hasattr(cls, attr):
-            setattr(cls, attr, getattr(cls, name)())
-        return getattr(cls, attr)(*a, **kw)
-    return call
+    # Look in the class itself, subclasses have nested classes of their own
+    try:
+        return cls.__dict__[attr]
+    except KeyError:
+        obj = getattr(cls, name)()
+        setattr(cls, attr, obj)
+        return obj
+
+class cache:
+    """
+    Gives the instance of the nested class `name` kept on the class it is
+    looked up on, which is called to use it or for its other methods.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, cls):
+        return instance(cls, self.name)
+
+
+class Closing:
+    """
+    Iterates over `iterable` and calls `callback` once it is exhausted or
+    closed, to finish up after streamed content is sent
+    """
+    def __init__(self, iterable, callback):
+        self.iterator = iter(iterable)
+        self.callback = callback
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if hasattr(self.iterator, 'close'):
+                self.iterator.close()
+        finally:
+            self.callback()
 
 
 if __name__ == '__main__':
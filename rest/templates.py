@@ -1,4 +1,88 @@
+import hashlib
+import functools
+
 from .structures import NestedClass
+from .planners import get_field
+
+
+class FrozenList(list):
+    """A list that can't be changed, and therefore can be hashed"""
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("'{}' object is immutable".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = extend = insert = pop = remove = clear = _immutable
+    reverse = sort = _immutable
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (list(self),)
+
+
+class FrozenDict(dict):
+    """A dict that can't be changed, and therefore can be hashed"""
+    def _immutable(self, *args, **kwargs):
+        raise TypeError("'{}' object is immutable".format(type(self).__name__))
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __hash__(self):
+        return hash(frozenset(self.items()))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (dict(self),)
+
+
+def freeze(val):
+    if isinstance(val, (FrozenDict, FrozenList)):
+        return val
+    elif isinstance(val, dict):
+        return FrozenDict((key, freeze(v)) for key, v in val.items())
+    elif isinstance(val, (list, tuple)):
+        return FrozenList(freeze(v) for v in val)
+    elif isinstance(val, set):
+        return frozenset(freeze(v) for v in val)
+    else:
+        return val
+
+
+def canonical(val):
+    """A representation of a template that is the same in every process"""
+    if isinstance(val, dict):
+        items = sorted((repr(key), canonical(v)) for key, v in val.items())
+        return '{' + ','.join(key + ':' + v for key, v in items) + '}'
+    elif isinstance(val, (list, tuple)):
+        return '[' + ','.join(canonical(v) for v in val) + ']'
+    elif isinstance(val, (set, frozenset)):
+        return '{' + ','.join(sorted(canonical(v) for v in val)) + '}'
+    elif callable(val):
+        func = getattr(val, '__func__', val)
+        return '{}.{}'.format(getattr(func, '__module__', ''),
+                getattr(func, '__qualname__', repr(func)))
+    else:
+        return repr(val)
+
+
+@functools.lru_cache(maxsize=256)
+def fingerprint(template):
+    """A digest of a compiled template for keys shared between processes"""
+    return hashlib.md5(canonical(template).encode('utf-8')).hexdigest()
+
 
 class Template(NestedClass):
     '''
@@ -23,7 +107,23 @@ class Template(NestedClass):
         return instance
     '''
 
+    # Compiled templates by their frozen options, for up to `max_compiled`
+    # of the most recently used
+    max_compiled = 256
+    _compiled = None
+
     def __call__(self, **options):
+        """
+        Returns the compiled template for the options. Templates are
+        compiled once per set of options and are immutable, call `copy()`
+        for a template to change.
+        """
+        if self._compiled is None:
+            self._compiled = functools.lru_cache(maxsize=self.max_compiled)(
+                    lambda options: self.compile(**options))
+        return self._compiled(freeze(options))
+
+    def compile(self, **options):
         template = {}
 
         #TODO use default options from settings
@@ -42,7 +142,7 @@ class Template(NestedClass):
             for key, val in template['related'].items():
                 template['related'][key] = build_template(val)
 
-        return template
+        return freeze(template)
 
 
 def build_template(val, **options):
@@ -51,9 +151,91 @@ def build_template(val, **options):
     elif callable(val):
         return val(**options)
     elif hasattr(val, '__getitem__') and 'template' in val:
-        return build_template(val, **options)
-    elif hasattr(val, 'copy'):
-        return val.copy()
+        return build_template(val['template'], **options)
     else:
-        return val
+        return freeze(val)
+
+
+
+def split_paths(paths):
+    """Groups dotted paths by their first name, keeping their order"""
+    groups = {}
+    for path in paths:
+        name, _, rest = path.partition('.')
+        groups.setdefault(name, [])
+        if rest:
+            groups[name].append(rest)
+    return groups
+
+
+def get_shown(template, model):
+    """The names a template shows: its fields, or the model's and related"""
+    if 'fields' in template:
+        return list(template['fields'])
+    names = [field.name for field in model._meta.concrete_fields]
+    names += [name for name in template.get('related', {}) if name not in names]
+    return names
+
+
+def select(template, paths, model):
+    """
+    Narrows a template to the fields named by dotted paths, like
+    `owner.name`. Raises ValueError for a path it does not show, so
+    nothing but what the template allows can be asked for.
+    """
+    groups = split_paths(paths)
+    shown = get_shown(template, model)
+    for name in groups:
+        if name not in shown:
+            raise ValueError(name)
+
+    aliases = template.get('aliases', {})
+    related = template.get('related', {})
+
+    fields = []
+    selected = {}
+    for name in shown:
+        if name not in groups:
+            continue
+        fields.append(name)
+
+        attr = aliases.get(name, name)
+        rest = groups[name]
+        if attr in related:
+            sub = related[attr]
+            if rest:
+                if not hasattr(sub, 'get') or sub.get('values_list'):
+                    raise ValueError(name + '.' + rest[0])
+                sub = select(sub, rest, get_field(model, attr).related_model)
+            selected[attr] = sub
+        elif rest:
+            raise ValueError(name + '.' + rest[0])
+
+    narrowed = dict(template)
+    narrowed['fields'] = fields
+    narrowed['related'] = selected
+    return freeze(narrowed)
+
+
+def expand(template, names, expandable):
+    """
+    Adds the related templates of `expandable` named by `names`. Raises
+    ValueError for a name that is not expandable.
+    """
+    related = dict(template.get('related', {}))
+    fields = list(template['fields']) if 'fields' in template else None
+
+    for name in names:
+        if name in related:
+            continue
+        if name not in expandable:
+            raise ValueError(name)
+        related[name] = build_template(expandable[name])
+        if fields is not None and name not in fields:
+            fields.append(name)
 
+    expanded = dict(template)
+    expanded['related'] = related
+    if fields is not None:
+        expanded['fields'] = fields
+    return freeze(expanded)
@@ -3,6 +3,11 @@ import unittest
 from .test_resource import *
 from .test_structures import *
 from .test_requests import *
+from .test_serializers import *
+from .test_caches import *
+from .test_middleware import *
+from .test_admission import *
+from .test_batch import *
 
 """
 suite = unittest.TestSuite(
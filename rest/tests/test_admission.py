@@ -0,0 +1,51 @@
+from django.test import TestCase, RequestFactory
+
+from rest import resources
+
+from . import models
+
+class AdmittedPerson(resources.Resource):
+    model = models.Person
+
+    class Admission:
+        concurrency = 1
+        retry_after = 5
+
+class StreamedPerson(AdmittedPerson):
+    stream = True
+    chunk_size = 2
+
+class AdmissionTestCase(TestCase):
+    def test_admission(self):
+        person = models.Person.objects.create(name='person', age=10)
+        admission = AdmittedPerson.admit
+        factory = RequestFactory()
+
+        # Another request is being handled
+        admission.slots.acquire()
+        try:
+            response = AdmittedPerson.view(factory.get('/persons'))
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '5')
+
+            # Requests for one object are let through
+            response = AdmittedPerson.view(factory.get('/persons/1'),
+                    uid=str(person.pk))
+            self.assertEqual(response.status_code, 200)
+        finally:
+            admission.slots.release()
+
+        response = AdmittedPerson.view(factory.get('/persons'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_stream(self):
+        for i in range(3):
+            models.Person.objects.create(name='person', age=i)
+        admission = StreamedPerson.admit
+
+        # The turn is held until the rows are sent
+        response = StreamedPerson.view(RequestFactory().get('/persons'))
+        self.assertFalse(admission.slots.acquire(blocking=False))
+        b''.join(response.streaming_content)
+        self.assertTrue(admission.slots.acquire(blocking=False))
+        admission.slots.release()
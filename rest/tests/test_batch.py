@@ -0,0 +1,127 @@
+import json
+
+from django.test import TestCase, TransactionTestCase, RequestFactory
+
+from rest import resources
+from rest import batch
+
+from . import models
+
+class BatchPerson(resources.Resource):
+    model = models.Person
+    name = 'batch_persons'
+
+    class Template:
+        fields = ['name', 'age']
+
+    class Validator:
+        def age(self, age):
+            if age < 0:
+                return "Please provide a positive age"
+
+class PrivatePerson(BatchPerson):
+    name = 'private_persons'
+    login_required = True
+
+class Anonymous:
+    def is_authenticated(self):
+        return False
+
+class Batch(batch.Batch):
+    resources = (BatchPerson, PrivatePerson)
+    workers = 1
+
+class PooledBatch(Batch):
+    workers = 4
+
+def post(operations, path='/batch', user=None, batch_class=Batch):
+    request = RequestFactory().post(path, json.dumps(operations),
+            content_type='application/json')
+    if user is not None:
+        request.user = user
+    return batch_class.view(request)
+
+class BatchTestCase(TestCase):
+    def send(self, operations, path='/batch', user=None):
+        response = post(operations, path, user)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(str(response.content, 'utf-8'))['data']
+
+    def test_batch(self):
+        person = models.Person.objects.create(name='person1', age=10)
+
+        results = self.send([
+            {'resource': 'batch_persons', 'method': 'POST',
+                'body': {'name': 'person2', 'age': 20}},
+            {'resource': 'batch_persons', 'query': {'limit': 1}},
+            {'resource': 'batch_persons', 'ids': {'uid': person.pk}},
+            {'resource': 'batch_persons', 'ids': {'uid': 0}},
+        ])
+
+        self.assertEqual([result['status'] for result in results],
+                [200, 200, 200, 404])
+        self.assertEqual(results[1]['body']['data'],
+                [{'name': 'person1', 'age': 10}])
+        self.assertEqual(results[2]['body'], {'name': 'person1', 'age': 10})
+        self.assertEqual(models.Person.objects.count(), 2)
+
+    def test_atomic(self):
+        results = self.send([
+            {'resource': 'batch_persons', 'method': 'POST',
+                'body': {'name': 'person1', 'age': 10}},
+            {'resource': 'batch_persons', 'method': 'POST',
+                'body': {'name': 'person2', 'age': -1}},
+            {'resource': 'batch_persons', 'method': 'POST',
+                'body': {'name': 'person3', 'age': 30}},
+        ], '/batch?atomic=true')
+
+        self.assertEqual([result['status'] for result in results],
+                [200, 400, 424])
+        self.assertEqual(models.Person.objects.count(), 0)
+
+    def test_login_required(self):
+        person = models.Person.objects.create(name='person1', age=10)
+
+        results = self.send([
+            {'resource': 'private_persons', 'ids': {'uid': person.pk}},
+            {'resource': 'private_persons', 'method': 'DELETE'},
+            {'resource': 'batch_persons', 'ids': {'uid': person.pk}},
+        ], user=Anonymous())
+
+        self.assertEqual([result['status'] for result in results],
+                [403, 403, 200])
+        self.assertEqual(models.Person.objects.count(), 1)
+
+    def test_invalid(self):
+        for operation in [
+                {'resource': 'batch_persons', 'ids': ['1']},
+                {'resource': 'batch_persons', 'ids': '1'},
+                {'resource': 'batch_persons', 'ids': {'request': '1'}},
+                {'resource': 'batch_persons', 'ids': {'uid': {'pk': 1}}},
+                {'resource': 'batch_persons', 'query': 'limit=1'},
+                {'resource': 'batch_persons', 'method': 1}]:
+            response = post([{'resource': 'batch_persons'}, operation])
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('operation 1', str(response.content, 'utf-8'))
+
+class PooledBatchTestCase(TransactionTestCase):
+    def test_reads(self):
+        persons = [models.Person.objects.create(name='person{}'.format(i),
+                age=i) for i in range(5)]
+
+        operations = [{'resource': 'batch_persons', 'ids': {'uid': person.pk}}
+                for person in persons]
+        operations.append({'resource': 'batch_persons', 'method': 'POST',
+                'body': {'name': 'person5', 'age': 5}})
+        operations.append({'resource': 'batch_persons',
+                'query': {'limit': 10}})
+
+        response = post(operations, batch_class=PooledBatch)
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(str(response.content, 'utf-8'))['data']
+
+        self.assertEqual([result['status'] for result in results], [200] * 7)
+        self.assertEqual([result['body']['age'] for result in results[:5]],
+                list(range(5)))
+        # Reads after a write see it
+        self.assertEqual(len(results[6]['body']['data']), 6)
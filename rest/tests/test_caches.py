@@ -0,0 +1,76 @@
+import time
+import threading
+from types import SimpleNamespace
+
+from django.core.cache import caches as django_caches
+from django.http import HttpResponse
+from django.test import TestCase
+
+from rest import caches
+
+from . import models
+
+class KeyedCache(caches.Cache):
+    timeout = 60
+
+    def get_key(self, resource):
+        return 'rest:test:' + resource.key
+
+class CacheTestCase(TestCase):
+    def setUp(self):
+        django_caches['default'].clear()
+
+    def test_single_flight(self):
+        cache = KeyedCache()
+        resource = SimpleNamespace(method='GET', key='flight')
+        calls = []
+
+        def respond():
+            calls.append(1)
+            time.sleep(.2)
+            return HttpResponse(b'content')
+
+        contents = []
+        def request():
+            contents.append(cache(resource, respond).content)
+
+        threads = [threading.Thread(target=request) for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(contents, [b'content'] * 5)
+
+    def test_stale(self):
+        cache = KeyedCache()
+        cache.stale = 60
+        resource = SimpleNamespace(method='GET', key='stale')
+        key = cache.get_key(resource)
+        backend = cache.get_cache()
+
+        def respond():
+            return HttpResponse(b'fresh')
+
+        # Expired, and another process is refreshing it
+        backend.set(key, (0, (200, b'stale', [])), 60)
+        backend.add(cache.get_lock_key(key), 1, 60)
+        self.assertEqual(cache(resource, respond).content, b'stale')
+
+        backend.delete(cache.get_lock_key(key))
+        self.assertEqual(cache(resource, respond).content, b'fresh')
+        self.assertEqual(cache(resource, lambda: None).content, b'fresh')
+
+    def test_watch(self):
+        author = models.Author.objects.create(name='author')
+        generations = caches.get_generations([models.Author])
+
+        # No cached resource reads authors
+        author.save()
+        self.assertEqual(caches.get_generations([models.Author]), generations)
+
+        caches.watch([models.Author])
+        author.save()
+        self.assertNotEqual(caches.get_generations([models.Author]),
+                generations)
@@ -0,0 +1,151 @@
+import threading
+
+from django.test import TestCase, RequestFactory
+
+from rest import resources
+from rest import middleware
+
+from . import models
+
+class ThrottledPerson(resources.Resource):
+    model = models.Person
+
+class StreamedThrottledPerson(ThrottledPerson):
+    stream = True
+    chunk_size = 2
+
+class LocalThrottle(middleware.Throttle):
+    alias = None
+    pool = 50
+    gain = 1
+
+class CountingCache(middleware.LocalCache):
+    calls = 0
+
+    def incr(self, key, delta=1):
+        self.calls += 1
+        return super().incr(key, delta)
+
+class LeasedThrottle(LocalThrottle):
+    local = CountingCache()
+    lease = 10
+
+    def renew_lease(self, key, lease):
+        # Renew in line so the test is deterministic
+        if next(lease.renewals) == 0:
+            self.take_lease(key, lease)
+
+class TolerantThrottle(LeasedThrottle):
+    tolerance = 5
+
+class CostlyThrottle(LocalThrottle):
+    row_cost = 1
+
+class ThrottleTestCase(TestCase):
+    def setUp(self):
+        LocalThrottle.local.clear()
+        LeasedThrottle.local.clear()
+        LeasedThrottle.local.calls = 0
+
+    def test_throttle(self):
+        throttle = LocalThrottle()
+        request = RequestFactory().get('/persons')
+
+        for i in range(50):
+            self.assertIsNone(throttle.process_view(request,
+                    ThrottledPerson.view, (), {}))
+        self.assertEqual(request.rate_limit['X-RateLimit-Remaining'], '0')
+
+        response = throttle.process_view(request, ThrottledPerson.view, (), {})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['X-RateLimit-Limit'], '50')
+        self.assertGreaterEqual(int(response['Retry-After']), 3600 - 1)
+
+        # Other views and clients are not throttled
+        self.assertIsNone(throttle.process_view(request, lambda r: r, (), {}))
+        other = RequestFactory().get('/persons', REMOTE_ADDR='10.0.0.1')
+        self.assertIsNone(throttle.process_view(other, ThrottledPerson.view,
+                (), {}))
+
+    def test_concurrency(self):
+        throttle = LocalThrottle()
+        allowed = []
+
+        def requests():
+            for i in range(10):
+                if throttle.take('concurrent', 1)[0]:
+                    allowed.append(1)
+
+        threads = [threading.Thread(target=requests) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(allowed), throttle.pool)
+
+    def test_lease(self):
+        throttle = LeasedThrottle()
+
+        allowed = [throttle.take_leased('leased', 1)[0] for i in range(50)]
+        self.assertTrue(all(allowed))
+        self.assertLess(throttle.local.calls, 10)
+
+        # Over the limit, every request goes to the cache again
+        self.assertFalse(throttle.take_leased('leased', 1)[0])
+
+    def test_tolerance(self):
+        throttle = TolerantThrottle()
+        throttle.take('tolerant', throttle.pool)
+
+        # An exhausted bucket gives empty leases, which tolerate nothing
+        for i in range(3):
+            allowed = [throttle.take_leased('tolerant', 1)[0]
+                    for j in range(throttle.tolerance + 1)]
+            self.assertFalse(any(allowed))
+            self.assertEqual(throttle.leases['tolerant'].points, 0)
+            throttle.leases['tolerant'].expires = 0
+
+    def test_sweep(self):
+        throttle = LeasedThrottle()
+        throttle.take_leased('gone', 1)
+        lease = throttle.leases['gone']
+
+        # Another client comes by after the lease expired
+        throttle.sweep(lease.expires)
+        self.assertNotIn('gone', throttle.leases)
+
+        # The points it didn't spend are back in the bucket
+        allowed, full, now = throttle.take('gone', 1)
+        self.assertEqual(throttle.get_headers(allowed, full, now, 1)
+                ['X-RateLimit-Remaining'], '48')
+
+    def test_cost(self):
+        for i in range(7):
+            models.Person.objects.create(name='person', age=i)
+
+        def remaining(query, resource=ThrottledPerson):
+            LocalThrottle.local.clear()
+            throttle = CostlyThrottle()
+            request = RequestFactory().get('/persons', query)
+            key = throttle.get_key(request)
+
+            throttle.process_view(request, resource.view, (), {})
+            response = throttle.process_response(request,
+                    resource.view(request))
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+            allowed, full, now = throttle.take(key, 1)
+            return throttle.get_headers(allowed, full, now, 1)[
+                    'X-RateLimit-Remaining']
+
+        # One point for the request and one per row read
+        self.assertEqual(remaining({'limit': 5}), '43')
+        self.assertEqual(remaining({'limit': 5, 'offset': 4}), '45')
+        self.assertEqual(remaining({}), '41')
+        self.assertEqual(remaining({'count': 'none'}), '41')
+
+        # Streamed rows are charged once they are sent
+        self.assertEqual(remaining({'count': 'none'},
+                StreamedThrottledPerson), '41')
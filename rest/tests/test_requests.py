@@ -1,8 +1,18 @@
+import gzip
 import json
+import unittest
+from urllib.parse import urlsplit
 
-from django.test import TestCase, Client
+from django.db import connection
+from django.db.models import F, Q
+from django.utils import timezone
+from django.test import TestCase, TransactionTestCase, Client
+from django.test.utils import CaptureQueriesContext
 
+from rest import counters
 from rest import resources
+from rest import slicers
+from rest import serializers
 from conf import urls
 
 from . import models
@@ -59,9 +69,117 @@ class PersonImage(resources.Subresource, Image):
                 queryset = queryset.filter(age__gte=18)
             return queryset
 
+class StreamedPerson(Person):
+    name = 'streamed_persons'
+    stream = True
+    chunk_size = 2
+
+class CursorPerson(Person):
+    name = 'cursor_persons'
+    Slicer = slicers.CursorSlicer
+
+class NamedCursorPerson(CursorPerson):
+    name = 'named_cursor_persons'
+
+    class Template:
+        fields = ['name']
+
+    class Slicer:
+        key = '-age'
+
+class ConditionalImage(Image):
+    name = 'conditional_images'
+    modified_field = 'timestamp'
+
+class VersionedPerson(Person):
+    name = 'versioned_persons'
+    version_field = 'age'
+
+class CachedImage(Image):
+    name = 'cached_images'
+
+    class Cache:
+        timeout = 60
+
+class FragmentImage(Image):
+    name = 'fragment_images'
+    modified_field = 'timestamp'
+
+    class Fragments:
+        timeout = 60
+
+class TitledFragmentImage(FragmentImage):
+    name = 'titled_fragment_images'
+
+    class Slicer(slicers.CursorSlicer):
+        key = 'title'
+
+class AdultPerson(Person):
+    name = 'adult_persons'
+
+    class Permission:
+        def read(self, resource):
+            return Q(age__gte=18)
+
+        def write(self, resource):
+            return False
+
+class GrownPerson(Person):
+    name = 'grown_persons'
+
+    class Permission:
+        def write(self, resource):
+            return Q(age__gte=18)
+
+class BulkPerson(Person):
+    name = 'bulk_persons'
+
+    class Validator:
+        def age(self, age):
+            if not isinstance(age, int) or age < 0:
+                return "Please provide a positive age"
+
+class CachedBulkPerson(BulkPerson):
+    name = 'cached_bulk_persons'
+
+    class Cache:
+        timeout = 60
+
+class SparseImage(resources.Resource):
+    model = models.Image
+    name = 'sparse_images'
+
+    class Template:
+        fields = ['title', 'url', 'owner']
+        related = {
+            'owner': Person,
+        }
+
+    expandable = {
+        'comment_set': Comment,
+    }
+
+class SideloadedImage(Image):
+    name = 'sideloaded_images'
+    sideload = True
+
 urls.urlpatterns += Image.urls()
 urls.urlpatterns += Person.urls()
 urls.urlpatterns += PersonImage.urls()
+urls.urlpatterns += StreamedPerson.urls()
+urls.urlpatterns += CursorPerson.urls()
+urls.urlpatterns += NamedCursorPerson.urls()
+urls.urlpatterns += ConditionalImage.urls()
+urls.urlpatterns += VersionedPerson.urls()
+urls.urlpatterns += CachedImage.urls()
+urls.urlpatterns += FragmentImage.urls()
+urls.urlpatterns += TitledFragmentImage.urls()
+urls.urlpatterns += AdultPerson.urls()
+urls.urlpatterns += GrownPerson.urls()
+urls.urlpatterns += BulkPerson.urls()
+urls.urlpatterns += CachedBulkPerson.urls()
+urls.urlpatterns += SparseImage.urls()
+urls.urlpatterns += SideloadedImage.urls()
 
 class RequestTestCase(TestCase):
     def test_request(self):
@@ -98,4 +216,517 @@ class RequestTestCase(TestCase):
         data = json.loads(content)
         self.assertEqual(data['url'], '/image3.jpg')
 
+    def test_stream(self):
+        for i in range(5):
+            models.Person.objects.create(name='person{}'.format(i), age=i)
+
+        c = Client()
+        response = c.get('/streamed_persons?limit=5')
+        self.assertTrue(response.streaming)
+
+        content = str(b''.join(response.streaming_content), 'utf-8')
+        data = json.loads(content)
+        self.assertEqual(len(data['data']), 5)
+        self.assertEqual(data['data'][4], {'name': 'person4', 'age': 4})
+        self.assertEqual(data['meta']['count'], 5)
+
+    def test_cursor(self):
+        for i in range(5):
+            models.Person.objects.create(name='person{}'.format(i), age=i)
+
+        def get(uri):
+            uri = urlsplit(str(uri))
+            response = c.get(uri.path + '?' + uri.query)
+            return json.loads(str(response.content, 'utf-8'))
+
+        c = Client()
+        page1 = get('/cursor_persons?limit=2')
+        self.assertEqual([p['age'] for p in page1['data']], [0, 1])
+        self.assertNotIn('prev', page1['meta'])
+
+        page2 = get(page1['meta']['next'])
+        self.assertEqual([p['age'] for p in page2['data']], [2, 3])
+
+        page3 = get(page2['meta']['next'])
+        self.assertEqual([p['age'] for p in page3['data']], [4])
+        self.assertNotIn('next', page3['meta'])
+
+        back = get(page3['meta']['prev'])
+        self.assertEqual(back['data'], page2['data'])
+
+        response = c.get('/cursor_persons?after=forged')
+        self.assertEqual(response.status_code, 400)
+
+        # Ordered on a field the template doesn't show
+        page1 = get('/named_cursor_persons?limit=3')
+        self.assertEqual(page1['data'],
+                [{'name': 'person4'}, {'name': 'person3'}, {'name': 'person2'}])
+        page2 = get(page1['meta']['next'])
+        self.assertEqual([p['name'] for p in page2['data']],
+                ['person1', 'person0'])
+
+    def test_counters(self):
+        for i in range(5):
+            models.Person.objects.create(name='person{}'.format(i), age=i)
+
+        c = Client()
+        response = c.get('/persons?limit=2&count=none')
+        meta = json.loads(str(response.content, 'utf-8'))['meta']
+        self.assertNotIn('count', meta)
+        self.assertIn('next', meta)
+
+        response = c.get('/persons?limit=2&offset=4&count=cached')
+        meta = json.loads(str(response.content, 'utf-8'))['meta']
+        self.assertEqual(meta['count'], 5)
+        self.assertEqual(meta['count_type'], 'cached')
+        self.assertNotIn('next', meta)
+
+        response = c.get('/persons?count=bogus')
+        self.assertEqual(response.status_code, 400)
+
+        estimated = counters.counters['estimated']
+        count, kind = estimated.count(slicers.Slicer(),
+                models.Person.objects.none())
+        self.assertEqual(count, 0)
+
+        # Backends without estimates count exactly, and say so
+        if connection.vendor != 'postgresql':
+            response = c.get('/persons?count=estimated')
+            meta = json.loads(str(response.content, 'utf-8'))['meta']
+            self.assertEqual(meta['count'], 5)
+            self.assertEqual(meta['count_type'], 'exact')
+
+        cached = counters.counters['cached']
+        count, kind = cached.count(slicers.Slicer(),
+                models.Person.objects.none())
+        self.assertEqual((count, kind), (0, 'exact'))
+
+    def test_plan(self):
+        def create(n):
+            person = models.Person.objects.create(name='person', age=10)
+            tag = models.Tag.objects.create(name='tag')
+            for i in range(n):
+                image = person.image_set.create(title='image', url='/image.jpg')
+                image.tags.add(tag)
+                image.comment_set.create(person=person, text='comment')
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = Client().get('/images')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        create(2)
+        few = count_queries()
+        create(8)
+        self.assertEqual(count_queries(), few)
+
+    def test_negotiation(self):
+        models.Person.objects.create(name='person', age=10)
+
+        c = Client()
+        response = c.get('/persons', HTTP_ACCEPT='text/html;q=0.9,*/*;q=0.8')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('Accept', response['Vary'])
+
+        response = c.get('/persons', HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, 406)
+
+        response = c.get('/persons?format=xml')
+        self.assertEqual(response.status_code, 406)
+
+    @unittest.skipIf(serializers.msgpack is None, 'msgpack is not installed')
+    def test_msgpack(self):
+        models.Person.objects.create(name='person', age=10)
+
+        c = Client()
+        response = c.get('/persons', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+
+        data = serializers.msgpack.unpackb(response.content, raw=False)
+        self.assertEqual(data['data'], [{'name': 'person', 'age': 10}])
+
+        person = Person()
+        person.parse_body(response.content, 'application/msgpack')
+        self.assertEqual(person.data['data'], data['data'])
+
+    def test_compression(self):
+        for i in range(100):
+            models.Person.objects.create(name='person{}'.format(i), age=i)
+
+        c = Client()
+        response = c.get('/persons', HTTP_ACCEPT_ENCODING='gzip, deflate;q=0.5')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        data = json.loads(str(gzip.decompress(response.content), 'utf-8'))
+        self.assertEqual(len(data['data']), 100)
+
+        response = c.get('/persons?limit=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = c.get('/streamed_persons', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        data = json.loads(str(content, 'utf-8'))
+        self.assertEqual(len(data['data']), 100)
+
+    def test_conditional(self):
+        person = models.Person.objects.create(name='person', age=10)
+        image = person.image_set.create(title='image', url='/image.jpg')
+
+        c = Client()
+        for uri in ('/conditional_images', '/conditional_images/{}'.format(image.pk)):
+            response = c.get(uri)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+            with CaptureQueriesContext(connection) as queries:
+                response = c.get(uri, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.content, b'')
+            self.assertEqual(len(queries), 1)
+
+            response = c.get(uri, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+
+            response = c.get(uri + '?format=json', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+        etag = c.get('/conditional_images')['ETag']
+        person.image_set.create(title='image2', url='/image2.jpg')
+        response = c.get('/conditional_images', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Bumping the version of a row below the highest one
+        models.Person.objects.create(name='other', age=20)
+        etag = c.get('/versioned_persons')['ETag']
+        models.Person.objects.filter(pk=person.pk).update(age=11)
+        response = c.get('/versioned_persons', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        # Replacing a row by another of the same version
+        etag = c.get('/versioned_persons')['ETag']
+        models.Person.objects.filter(pk=person.pk).delete()
+        models.Person.objects.create(name='new', age=11)
+        response = c.get('/versioned_persons', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache(self):
+        person = models.Person.objects.create(name='person', age=10)
+        image = person.image_set.create(title='image', url='/image.jpg')
+
+        def get():
+            response = c.get('/cached_images')
+            return json.loads(str(response.content, 'utf-8'))
+
+        c = Client()
+        data = get()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get(), data)
+        self.assertEqual(len(queries), 0)
+
+        # Changing a model the template reads invalidates the response
+        person.name = 'renamed'
+        person.save()
+        self.assertEqual(get()['data'][0]['owner']['name'], 'renamed')
+
+        image.comment_set.create(person=person, text='comment')
+        self.assertEqual(len(get()['data'][0]['comment_set']), 1)
+
+    def test_fragments(self):
+        person = models.Person.objects.create(name='person', age=10)
+        images = [person.image_set.create(title='image{}'.format(i),
+                url='/image.jpg') for i in range(3)]
+
+        def get():
+            response = c.get('/fragment_images')
+            return json.loads(str(response.content, 'utf-8'))
+
+        def titles():
+            return sorted(row['title'] for row in get()['data'])
+
+        c = Client()
+        data = get()
+        self.assertEqual(len(data['data']), 3)
+        self.assertEqual(data['meta']['count'], 3)
+
+        # Only the count and the keys and versions of the page are read
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(get(), data)
+        self.assertEqual(len(queries), 2)
+
+        # A new version renders that row again
+        models.Image.objects.filter(pk=images[1].pk).update(title='changed',
+                timestamp=timezone.now())
+        self.assertEqual(titles(), ['changed', 'image0', 'image2'])
+
+        # Changing another model the template reads renders all rows again
+        person.name = 'renamed'
+        person.save()
+        for row in get()['data']:
+            self.assertEqual(row['owner']['name'], 'renamed')
+
+        # Bulk patches move the versions of the rows they write
+        response = c.patch('/fragment_images',
+                json.dumps([{'id': images[0].pk, 'title': 'patched'}]),
+                content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(titles(), ['changed', 'image2', 'patched'])
+
+        # Keyset pages read the column they order on with the versions
+        response = c.get('/titled_fragment_images?limit=2')
+        page = json.loads(str(response.content, 'utf-8'))
+        self.assertEqual([row['title'] for row in page['data']],
+                ['changed', 'image2'])
+        self.assertIn('next', page['meta'])
+
+    def test_permission(self):
+        adult = models.Person.objects.create(name='adult', age=30)
+        child = models.Person.objects.create(name='child', age=10)
+
+        c = Client()
+        response = c.get('/adult_persons')
+        data = json.loads(str(response.content, 'utf-8'))
+        self.assertEqual([row['name'] for row in data['data']], ['adult'])
+        self.assertEqual(data['meta']['count'], 1)
+
+        self.assertEqual(c.get('/adult_persons/{}'.format(adult.pk))
+                .status_code, 200)
+        self.assertEqual(c.get('/adult_persons/{}'.format(child.pk))
+                .status_code, 404)
+
+        # Nothing may be written
+        c.delete('/adult_persons')
+        self.assertEqual(models.Person.objects.count(), 2)
+
+        response = c.put('/adult_persons/{}'.format(child.pk + 1),
+                json.dumps({'name': 'new', 'age': 40}),
+                content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(models.Person.objects.count(), 2)
+
+        # Rows created must be ones the rule allows
+        def send(method, path, data):
+            return getattr(c, method)(path, json.dumps(data),
+                    content_type='application/json')
+
+        response = send('post', '/grown_persons', {'name': 'kid', 'age': 5})
+        self.assertEqual(response.status_code, 403)
+        response = send('post', '/grown_persons', [
+            {'name': 'grown', 'age': 40},
+            {'name': 'kid', 'age': 5},
+        ])
+        self.assertEqual(response.status_code, 403)
+        response = send('put', '/grown_persons/{}'.format(child.pk + 1),
+                {'name': 'kid', 'age': 5})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(models.Person.objects.count(), 2)
+
+        response = send('post', '/grown_persons', {'name': 'grown', 'age': 40})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(models.Person.objects.count(), 3)
+
+    def test_bulk(self):
+        c = Client()
+
+        def send(method, data, path='/bulk_persons'):
+            return getattr(c, method)(path, json.dumps(data),
+                    content_type='application/json')
+
+        response = send('post', [
+            {'name': 'person1', 'age': 10},
+            {'name': 'person2', 'age': 20},
+            {'name': 'person3', 'age': 30},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(models.Person.objects.count(), 3)
+
+        # Errors are reported by index, and nothing is written
+        response = send('post', [
+            {'name': 'person4', 'age': 40},
+            {'name': 'person5', 'age': -1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(json.loads(str(response.content, 'utf-8'))),
+                ['1'])
+        self.assertEqual(models.Person.objects.count(), 3)
+
+        persons = list(models.Person.objects.order_by('age'))
+        response = send('patch', [
+            {'id': persons[0].pk, 'age': 11},
+            {'id': persons[1].pk, 'age': 21, 'name': 'renamed'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(models.Person.objects.order_by('age')
+                    .values_list('name', 'age')),
+            [('person1', 11), ('renamed', 21), ('person3', 30)])
+
+        c.delete('/bulk_persons?limit=1')
+        self.assertEqual(models.Person.objects.count(), 2)
+        c.delete('/bulk_persons')
+        self.assertEqual(models.Person.objects.count(), 0)
+
+    def test_patch(self):
+        person = models.Person.objects.create(name='person', age=10)
+        image = person.image_set.create(title='image', url='/image.jpg')
+        path = '/conditional_images/{}'.format(image.pk)
+
+        c = Client()
+        etag = c.get(path)['ETag']
+
+        def patch(path, data, **headers):
+            return c.patch(path, json.dumps(data),
+                    content_type='application/json', **headers)
+
+        response = patch(path, {'title': 'changed'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        image = models.Image.objects.get(pk=image.pk)
+        self.assertEqual((image.title, image.url), ('changed', '/image.jpg'))
+
+        response = patch(path, {'title': 'lost'}, HTTP_IF_MATCH='"stale.0"')
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(models.Image.objects.get(pk=image.pk).title,
+                'changed')
+
+        response = patch('/conditional_images/0', {'title': 'none'})
+        self.assertEqual(response.status_code, 404)
+
+        # The patch moved the modification time, so its tag is used up
+        response = patch(path, {'title': 'again'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        response = c.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_put(self):
+        person = models.Person.objects.create(name='person', age=1)
+        path = '/versioned_persons/{}'.format(person.pk)
+
+        c = Client()
+
+        def put(data, **headers):
+            return c.put(path, json.dumps(data),
+                    content_type='application/json', **headers)
+
+        # Another write gets in between reading and replacing
+        etag = c.get(path)['ETag']
+        models.Person.objects.filter(pk=person.pk).update(age=F('age') + 1)
+        response = put({'name': 'lost', 'age': 1}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertEqual(models.Person.objects.get(pk=person.pk).name, 'person')
+
+        etag = c.get(path)['ETag']
+        response = put({'name': 'renamed', 'age': 2}, HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        person = models.Person.objects.get(pk=person.pk)
+        self.assertEqual((person.name, person.age), ('renamed', 3))
+
+        c.delete(path)
+        self.assertFalse(models.Person.objects.filter(pk=person.pk).exists())
+
+    def test_multi_get(self):
+        persons = [models.Person.objects.create(name='person{}'.format(i),
+                age=i * 10) for i in range(3)]
+
+        def get(path):
+            return json.loads(str(c.get(path).content, 'utf-8'))
+
+        c = Client()
+        with CaptureQueriesContext(connection) as queries:
+            data = get('/persons/{},{},0'.format(persons[2].pk, persons[0].pk))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([row['name'] for row in data['data']],
+                ['person2', 'person0'])
+        self.assertEqual(data['meta'], {'missing': ['0']})
+
+        data = get('/persons?ids={},{}'.format(persons[1].pk, persons[2].pk))
+        self.assertEqual([row['name'] for row in data['data']],
+                ['person1', 'person2'])
+        self.assertEqual(data['meta'], {'missing': []})
+
+    def test_fieldsets(self):
+        person = models.Person.objects.create(name='person', age=10)
+        image = person.image_set.create(title='image', url='/image.jpg')
+        image.comment_set.create(person=person, text='comment')
+
+        c = Client()
+
+        def get(query):
+            response = c.get('/sparse_images?' + query)
+            if response.status_code != 200:
+                return response.status_code
+            return json.loads(str(response.content, 'utf-8'))['data'][0]
+
+        self.assertEqual(get('fields=title,owner.name'),
+                {'title': 'image', 'owner': {'name': 'person'}})
+        self.assertEqual(get('fields=url'), {'url': '/image.jpg'})
+
+        row = get('expand=comment_set')
+        self.assertEqual(len(row['comment_set']), 1)
+        self.assertEqual(row['owner'], {'name': 'person', 'age': 10})
+
+        row = get('fields=title&expand=comment_set')
+        self.assertEqual(sorted(row), ['comment_set', 'title'])
+
+        # Only what the template shows or may expand can be asked for
+        self.assertEqual(get('fields=timestamp'), 400)
+        self.assertEqual(get('fields=title.name'), 400)
+        self.assertEqual(get('expand=tags'), 400)
+
+    def test_sideload(self):
+        persons = [
+            models.Person.objects.create(name='person1', age=10),
+            models.Person.objects.create(name='person2', age=20),
+        ]
+        for i, person in enumerate(persons + persons[:1]):
+            person.image_set.create(title='image{}'.format(i), url='/image.jpg')
+
+        c = Client()
+        response = c.get('/sideloaded_images')
+        data = json.loads(str(response.content, 'utf-8'))
+
+        self.assertEqual(sorted(row['owner'] for row in data['data']),
+                sorted([persons[0].pk, persons[0].pk, persons[1].pk]))
+        self.assertEqual(data['included']['owner'], {
+            str(persons[0].pk): {'name': 'person1', 'age': 10},
+            str(persons[1].pk): {'name': 'person2', 'age': 20},
+        })
+        self.assertEqual(data['meta']['count'], 3)
+
+        # Clients may ask for nested objects in stead
+        response = c.get('/sideloaded_images?sideload=false')
+        data = json.loads(str(response.content, 'utf-8'))
+        self.assertNotIn('included', data)
+        self.assertEqual(data['data'][0]['owner']['name'], 'person1')
+
+        response = c.get('/sideloaded_images/{}'.format(
+                models.Image.objects.get(title='image1').pk))
+        data = json.loads(str(response.content, 'utf-8'))
+        self.assertEqual(data['data']['owner'], persons[1].pk)
+        self.assertEqual(list(data['included']['owner']), [str(persons[1].pk)])
+
+
+class CommitTestCase(TransactionTestCase):
+    """Requests whose effects wait for the transaction to commit"""
+    def test_bulk_cache(self):
+        person = models.Person.objects.create(name='person', age=10)
+
+        def get():
+            response = c.get('/cached_bulk_persons')
+            return json.loads(str(response.content, 'utf-8'))['data']
+
+        def send(method, data):
+            return getattr(c, method)('/cached_bulk_persons',
+                    json.dumps(data), content_type='application/json')
+
+        c = Client()
+        self.assertEqual([row['age'] for row in get()], [10])
+
+        send('patch', [{'id': person.pk, 'age': 11}])
+        self.assertEqual([row['age'] for row in get()], [11])
+
+        send('post', [{'name': 'other', 'age': 20}])
+        self.assertEqual(sorted(row['age'] for row in get()), [11, 20])
 
+        c.delete('/cached_bulk_persons')
+        self.assertEqual(get(), [])
@@ -118,9 +118,11 @@ class ResourceTestCase(TestCase):
 
         self.assertEqual(books, (
             'books$',
+            'books/(?P<uids>[^/]*,[^/]*)$',
             'books/(?P<uid>[^/]+)$'))
         self.assertEqual(authorbooks, (
             'authors/(?P<rel>[^/]+)/books$',
+            'authors/(?P<rel>[^/]+)/books/(?P<uids>[^/]*,[^/]*)$',
             'authors/(?P<rel>[^/]+)/books/(?P<uid>[^/]+)$'))
 
 
@@ -140,6 +142,14 @@ class ResourceTestCase(TestCase):
         }
 
         self.assertEqual(book.template(), check)
+        self.assertIs(book.get_template(), book.template())
+
+        mini = Book(template={'fields': ['isbn']})
+        self.assertEqual(mini.get_template()['fields'], ['isbn'])
+        self.assertIs(mini.get_template(), Book(template={'fields': ['isbn']}).get_template())
+
+        with self.assertRaises(TypeError):
+            book.get_template()['fields'].append('summary')
 
 
     def test_request(self):
@@ -170,8 +180,31 @@ class ResourceTestCase(TestCase):
             ],
             'meta': {
                 'count': 1,
+                'count_type': 'exact',
             },
         }
 
         self.assertEqual(data, check)
 
+    def test_read_values(self):
+        author = models.Author.objects.create(name='jan')
+        author.book_set.create(isbn='ABC123', title='Title')
+        author.book_set.create(isbn='DEF456', title='Other')
+
+        class InstanceBook(Book):
+            read_values = False
+
+        books = Book()
+        instances = InstanceBook()
+
+        self.assertTrue(books.use_values())
+        self.assertFalse(instances.use_values())
+        self.assertEqual(books.act().content, instances.act().content)
+
+        book = Book(ids={'uid': 'DEF456'})
+        data = json.loads(str(book.act().content, 'utf-8'))
+        self.assertEqual(data, {
+            'isbn': 'DEF456',
+            'title': 'Other',
+            'author': {'name': 'jan'},
+        })
@@ -0,0 +1,71 @@
+import json
+import uuid
+import decimal
+import datetime
+
+from django.test import TestCase
+
+from rest import serializers
+
+class SerializerTestCase(TestCase):
+    def test_json(self):
+        data = {
+            'timestamp': datetime.datetime(2013, 5, 1, 12, 30),
+            'price': decimal.Decimal('9.95'),
+            'uid': uuid.UUID(int=1),
+            'tags': {'kitten'},
+        }
+
+        for fast in (True, False):
+            serializer = serializers.Serializer()
+            serializer.fast = fast
+            content = serializer.json(data)
+
+            self.assertIsInstance(content, bytes)
+            self.assertEqual(json.loads(str(content, 'utf-8')), {
+                'timestamp': '2013-05-01T12:30:00',
+                'price': '9.95',
+                'uid': '00000000-0000-0000-0000-000000000001',
+                'tags': ['kitten'],
+            })
+
+    def test_register(self):
+        class Point:
+            def __init__(self, x, y):
+                self.x, self.y = x, y
+
+        class Serializer(serializers.Serializer):
+            pass
+
+        @Serializer.register(Point)
+        def point(value):
+            return [value.x, value.y]
+
+        self.assertEqual(Serializer().json([Point(1, 2)]), b'[[1,2]]')
+        self.assertNotIn(Point, serializers.Serializer.encoders)
+
+        with self.assertRaises(TypeError):
+            serializers.Serializer().json(Point(1, 2))
+
+    def test_override_native(self):
+        class Serializer(serializers.Serializer):
+            pass
+
+        Serializer.register(datetime.date)(lambda value: 'date')
+        Serializer.register(uuid.UUID)(lambda value: 'uuid')
+
+        for fast in (True, False):
+            serializer = Serializer()
+            serializer.fast = fast
+            self.assertEqual(serializer.json([datetime.date(2013, 5, 1),
+                    uuid.UUID(int=1), 2 ** 70]),
+                    b'["date","uuid",1180591620717411303424]')
+
+    def test_stream(self):
+        serializer = serializers.Serializer()
+        chunks = [[{'a': 1}, {'a': 2}], [{'a': 3}]]
+        meta = {'count': 3}
+
+        content = b''.join(serializer.json_stream(iter(chunks), meta))
+        check = serializer.json({'data': sum(chunks, []), 'meta': meta})
+        self.assertEqual(content, check)
@@ -54,3 +54,54 @@ class StructuresTestCase(TestCase):
 
         self.assertEqual(resource, check)
 
+    def test_dispatch_order(self):
+        class Base(structures.Mapper):
+            def b(self, resource, val):
+                resource.append('b')
+            def a(self, resource, val):
+                resource.append('a')
+
+        class Mapper(Base):
+            def c(self, resource, val):
+                resource.append('c')
+            def b(self, resource, val):
+                resource.append('B')
+
+        resource = []
+        Mapper()(resource, c=None, a=None, b=None, d=None)
+
+        self.assertEqual(resource, ['B', 'a', 'c'])
+        self.assertIs(Mapper._table(), Mapper._table())
+        self.assertEqual([name for name, method in Base._table()], ['b', 'a'])
+
+    def test_updater_batch(self):
+        calls = []
+
+        class Updater(structures.Updater):
+            omits = ('secret',)
+
+            def double(self, data):
+                return data['amount'] * 2
+
+            @structures.column
+            def amount(self, values):
+                calls.append('amount')
+                return [value + 1 for value in values]
+
+            @structures.batch
+            def total(self, rows):
+                calls.append('total')
+                total = sum(row['amount'] for row in rows)
+                return [total] * len(rows)
+
+        rows = [{'amount': 1, 'secret': 1}, {'amount': 2, 'secret': 2}]
+        data = Updater()(rows)
+
+        self.assertEqual(data, [
+            {'amount': 2, 'double': 2, 'total': 5},
+            {'amount': 3, 'double': 4, 'total': 5},
+        ])
+        self.assertEqual(calls, ['amount', 'total'])
+
+        data = Updater()({'amount': 1})
+        self.assertEqual(data, {'amount': 2, 'double': 2, 'total': 2})
@@ -1,9 +1,10 @@
-from .structures import NestedClass
+from .structures import NestedApi
 
-class Validator(NestedClass):
+class Validator(NestedApi):
     """
     When called with a dictionary, the validator runs all methods
-    matching its keys with their values as parameter. When a method
+    matching its keys with their values as parameter, in the order they
+    are defined. When a method
     returns a string, it is added to a dictionary of error messages.
 
     The special cases before and after are called at their respective
@@ -19,10 +20,9 @@ class Validator(NestedClass):
             for key, val in self.before(data):
                 messages[key] = val
 
-        for key, val in data.items():
-            validator = getattr(self, key, None)
-            if validator:
-                m = validator(val)
+        for key, validator in self._table():
+            if key in data:
+                m = validator(self, data[key])
                 if m:
                     messages[key] = m
 